@@ -1,8 +1,13 @@
 import os
+import asyncio
+import json
 import logging
 import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from starlette.status import HTTP_400_BAD_REQUEST
 import httpx
 
@@ -11,27 +16,434 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "CRITICAL").upper()
 logging.basicConfig(level=getattr(logging, LOG_LEVEL))
 log = logging.getLogger("nim-proxy")
 
-# URLs for NIM services
+# URLs for NIM services, comma separated URLs of several replicas are balanced
 NIM_EMBEDDING_URL = os.getenv("NIM_EMBEDDING_URL", "http://nemoretriever-embedding-ms:8000/v1/embeddings")
 NIM_RERANKER_URL = os.getenv("NIM_RERANKER_URL", "http://nemoretriever-ranking-ms:8000/v1/ranking")
 DEFAULT_RERANK_MODEL = os.getenv("NIM_RANKING_MODELNAME", "nvidia/nv-rerankqa-mistral-4b-v3")
 
-app = FastAPI()
+# Connection pool and timeouts of the client shared by all proxied calls
+NIM_PROXY_HTTP2 = os.getenv("NIM_PROXY_HTTP2", "True").lower() == "true"
+NIM_PROXY_MAX_CONNECTIONS = int(os.getenv("NIM_PROXY_MAX_CONNECTIONS", 100))
+NIM_PROXY_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("NIM_PROXY_MAX_KEEPALIVE_CONNECTIONS", 20))
+NIM_PROXY_KEEPALIVE_EXPIRY = float(os.getenv("NIM_PROXY_KEEPALIVE_EXPIRY", 30))
+NIM_PROXY_CONNECT_TIMEOUT = float(os.getenv("NIM_PROXY_CONNECT_TIMEOUT", 5))
+NIM_PROXY_TIMEOUT = float(os.getenv("NIM_PROXY_TIMEOUT", 60))
+
+# Response headers passed through with the streamed body of the NIM
+PASSTHROUGH_HEADERS = ("content-type", "content-encoding")
+
+# Concurrent embedding requests are sent to the NIM together, in batches of up to this many inputs, 1 disables batching
+NIM_PROXY_EMBEDDING_BATCH_SIZE = int(os.getenv("NIM_PROXY_EMBEDDING_BATCH_SIZE", 32))
+# Milliseconds the first request of a batch waits for others to join it
+NIM_PROXY_EMBEDDING_BATCH_WAIT_MS = float(os.getenv("NIM_PROXY_EMBEDDING_BATCH_WAIT_MS", 5))
+
+# Calls to the NIMs are scheduled in two lanes, so bulk ingestion traffic does not delay interactive queries.
+# Requests set their lane with the X-Request-Priority header, embedding requests of passages or of at least
+# NIM_PROXY_BULK_MIN_INPUTS inputs default to the bulk lane, all other requests to the interactive lane.
+INTERACTIVE_LANE = "interactive"
+BULK_LANE = "bulk"
+PRIORITY_HEADER = "X-Request-Priority"
+NIM_PROXY_BULK_MIN_INPUTS = int(os.getenv("NIM_PROXY_BULK_MIN_INPUTS", 8))
+# Maximum number of concurrent calls to the NIMs, and of those for the bulk lane
+NIM_PROXY_MAX_INFLIGHT = int(os.getenv("NIM_PROXY_MAX_INFLIGHT", 64))
+NIM_PROXY_BULK_MAX_INFLIGHT = int(os.getenv("NIM_PROXY_BULK_MAX_INFLIGHT", 8))
+# Share of the freed call slots given to each lane while both have requests waiting
+NIM_PROXY_INTERACTIVE_WEIGHT = int(os.getenv("NIM_PROXY_INTERACTIVE_WEIGHT", 4))
+NIM_PROXY_BULK_WEIGHT = int(os.getenv("NIM_PROXY_BULK_WEIGHT", 1))
+
+
+class LaneScheduler:
+    """Limits the concurrent calls to the NIMs and shares them between priority lanes.
+
+    A call starts right away if a slot is free and no call of its lane is waiting. Otherwise it waits in the
+    queue of its lane, and freed slots are given to the waiting lanes by smooth weighted round robin, skipping
+    lanes at their own concurrency cap.
+    """
+
+    def __init__(self, max_inflight: int, lanes: dict):
+        self.max_inflight = max_inflight
+        # Weight and concurrency cap by lane
+        self.lanes = lanes
+        self.inflight = {lane: 0 for lane in lanes}
+        self.requests = {lane: 0 for lane in lanes}
+        self._queues = {lane: deque() for lane in lanes}
+        self._credits = {lane: 0 for lane in lanes}
+
+    def queue_depth(self, lane: str) -> int:
+        return len(self._queues[lane])
+
+    async def acquire(self, lane: str) -> None:
+        """Wait until a call of the lane may start, it has to be ended by release()."""
+        self.requests[lane] += 1
+        if not self._queues[lane] and self._can_start(lane):
+            self.inflight[lane] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues[lane].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted while being cancelled, pass the slot on
+                self.release(lane)
+            else:
+                self._queues[lane].remove(future)
+            raise
+
+    def release(self, lane: str) -> None:
+        self.inflight[lane] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def _can_start(self, lane: str) -> bool:
+        _, max_inflight = self.lanes[lane]
+        return sum(self.inflight.values()) < self.max_inflight and self.inflight[lane] < max_inflight
+
+    def _dispatch(self) -> None:
+        while True:
+            ready = [lane for lane in self.lanes if self._queues[lane] and self._can_start(lane)]
+            if not ready:
+                return
+            for lane in ready:
+                self._credits[lane] += self.lanes[lane][0]
+            lane = max(ready, key=lambda name: self._credits[name])
+            self._credits[lane] -= sum(self.lanes[name][0] for name in ready)
+            future = self._queues[lane].popleft()
+            if not future.done():
+                self.inflight[lane] += 1
+                future.set_result(None)
+
+
+def get_lane(request: Request, payload: dict) -> str:
+    """Priority lane of a request, from its X-Request-Priority header or its embedding payload"""
+    priority = (request.headers.get(PRIORITY_HEADER) or "").lower()
+    if priority in (INTERACTIVE_LANE, BULK_LANE):
+        return priority
+    inputs = payload.get("input")
+    if payload.get("input_type") == "passage" or (isinstance(inputs, list) and len(inputs) >= NIM_PROXY_BULK_MIN_INPUTS):
+        return BULK_LANE
+    return INTERACTIVE_LANE
+
+# Replicas failing this many calls in a row are ejected from balancing for NIM_PROXY_EJECTION_SECONDS
+NIM_PROXY_EJECTION_FAILURES = int(os.getenv("NIM_PROXY_EJECTION_FAILURES", 3))
+NIM_PROXY_EJECTION_SECONDS = float(os.getenv("NIM_PROXY_EJECTION_SECONDS", 30))
+# Send a duplicate of an interactive call to a second replica once it takes longer than the observed p95 latency
+NIM_PROXY_HEDGING = os.getenv("NIM_PROXY_HEDGING", "False").lower() == "true"
+# Number of recent call latencies the p95 is computed from, and needed before hedging starts
+NIM_PROXY_LATENCY_WINDOW = int(os.getenv("NIM_PROXY_LATENCY_WINDOW", 200))
+NIM_PROXY_HEDGING_MIN_SAMPLES = int(os.getenv("NIM_PROXY_HEDGING_MIN_SAMPLES", 20))
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+class UpstreamPool:
+    """Balances the calls to a NIM over its replicas.
+
+    Each call goes to the replica with the fewest outstanding calls among those not ejected. A replica is
+    ejected for ejection_seconds after ejection_failures failed calls in a row, failures being transport
+    errors and 5xx responses. If every replica is ejected, the one ejected first is used. With hedging, a
+    call still running after the p95 latency of recent calls is duplicated to another replica and the first
+    successful response is used.
+    """
+
+    def __init__(self, name: str, urls: str, client: httpx.AsyncClient):
+        self.name = name
+        self.client = client
+        self.replicas = [Replica(url.strip()) for url in urls.split(",") if url.strip()]
+        self.hedged_requests = 0
+        self._latencies = deque(maxlen=NIM_PROXY_LATENCY_WINDOW)
+        self._next = 0
+
+    def acquire(self, exclude: Replica = None) -> Replica:
+        """Pick the replica of the next call, it has to be ended by release()."""
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas if replica is not exclude] or self.replicas
+        healthy = [replica for replica in candidates if not replica.is_ejected(now)]
+        if healthy:
+            # Rotate the start of the search, so ties are spread over the replicas
+            self._next = (self._next + 1) % len(healthy)
+            rotated = healthy[self._next:] + healthy[:self._next]
+            replica = min(rotated, key=lambda candidate: candidate.outstanding)
+        else:
+            replica = min(candidates, key=lambda candidate: candidate.ejected_until)
+        replica.outstanding += 1
+        return replica
+
+    def release(self, replica: Replica, duration: float, succeeded: bool) -> None:
+        """End a call picked by acquire(), recording its outcome."""
+        replica.outstanding -= 1
+        if succeeded:
+            replica.consecutive_failures = 0
+            self._latencies.append(duration)
+            return
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= NIM_PROXY_EJECTION_FAILURES and not replica.is_ejected(time.monotonic()):
+            log.warning(f"Ejecting {self.name} replica {replica.url} for {NIM_PROXY_EJECTION_SECONDS}s after {replica.consecutive_failures} failed calls")
+            replica.ejected_until = time.monotonic() + NIM_PROXY_EJECTION_SECONDS
+
+    def cancel(self, replica: Replica) -> None:
+        """End a call picked by acquire() that was cancelled, neither a failure nor a latency sample."""
+        replica.outstanding -= 1
+
+    def p95_latency(self):
+        """95th percentile latency in seconds of the recent successful calls, None without enough samples."""
+        if len(self._latencies) < NIM_PROXY_HEDGING_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    async def post(self, payload: dict, hedge: bool = False) -> httpx.Response:
+        """POST the payload to a replica, hedged to a second replica if enabled and the call is slow."""
+        hedge_after = self.p95_latency() if hedge and NIM_PROXY_HEDGING and len(self.replicas) > 1 else None
+        primary_replica = self.acquire()
+        if hedge_after is None:
+            return await self._call(primary_replica, payload)
+
+        primary = asyncio.create_task(self._call(primary_replica, payload))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+            self.hedged_requests += 1
+            log.debug(f"Hedging {self.name} call after {hedge_after:.3f}s")
+            pending.add(asyncio.create_task(self._call(self.acquire(exclude=primary_replica), payload)))
+            finished = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished += done
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        return task.result()
+            # Neither call succeeded, prefer a response over an exception
+            finished.sort(key=lambda task: task.exception() is not None)
+            return finished[0].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, replica: Replica, payload: dict) -> httpx.Response:
+        start_time = time.perf_counter()
+        try:
+            resp = await self.client.post(replica.url, json=payload)
+        except asyncio.CancelledError:
+            # Calls cancelled by a faster hedge or a disconnected client do not judge the replica
+            self.cancel(replica)
+            raise
+        except Exception:
+            self.release(replica, time.perf_counter() - start_time, succeeded=False)
+            raise
+        self.release(replica, time.perf_counter() - start_time, succeeded=resp.status_code < 500)
+        return resp
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding requests and sends their inputs to the NIM in a single request.
+
+    Only requests with the same parameters besides the input, like model and input_type, are batched together.
+    A batch is sent once it holds max_size inputs or max_wait_ms after its first request arrived, and the
+    embeddings are scattered back to the waiting requests.
+    """
+
+    def __init__(self, upstream: UpstreamPool, scheduler: LaneScheduler, max_size: int, max_wait_ms: float):
+        self.upstream = upstream
+        self.scheduler = scheduler
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        # Pending requests by batch key, as (inputs, future) pairs
+        self._pending = {}
+        self._pending_sizes = {}
+        self._timers = {}
+        # References to the batches in flight, tasks are only weakly referenced by the event loop
+        self._tasks = set()
+
+    async def embed(self, payload: dict, lane: str) -> dict:
+        """Return the embeddings response for the payload, once the batch it joined has been embedded."""
+        inputs = payload.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        key = json.dumps([lane, {name: value for name, value in payload.items() if name != "input"}], sort_keys=True)
+
+        if self._pending_sizes.get(key, 0) + len(inputs) > self.max_size:
+            self._flush(key)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append((inputs, future))
+        self._pending_sizes[key] = self._pending_sizes.get(key, 0) + len(inputs)
+
+        if self._pending_sizes[key] >= self.max_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        requests = self._pending.pop(key, [])
+        self._pending_sizes.pop(key, None)
+        if requests:
+            task = asyncio.create_task(self._send(*json.loads(key), requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, lane: str, parameters: dict, requests: list) -> None:
+        payload = {**parameters, "input": [text for inputs, _ in requests for text in inputs]}
+        log.debug(f"Embedding batch of {len(payload['input'])} inputs from {len(requests)} requests in {lane} lane")
+        try:
+            async with self.scheduler.slot(lane):
+                resp = await self.upstream.post(payload, hedge=lane == INTERACTIVE_LANE)
+            resp.raise_for_status()
+            nim_response = resp.json()
+            embeddings = sorted(nim_response["data"], key=lambda item: item["index"])
+        except Exception as e:
+            if isinstance(e, httpx.HTTPStatusError):
+                if e.response.status_code < 500 and len(requests) > 1:
+                    # A client error is caused by the input of some request, resend them one by one so only
+                    # the offending requests fail
+                    log.warning(f"NIM rejected embedding batch of {len(requests)} requests, resending them one by one")
+                    await asyncio.gather(*(self._send(lane, parameters, [request]) for request in requests))
+                    return
+                log.error(f"NIM embedding error: {e.response.text}")
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for inputs, future in requests:
+            data = [{**item, "index": index} for index, item in enumerate(embeddings[offset:offset + len(inputs)])]
+            offset += len(inputs)
+            if not future.done():
+                # Token usage is only reported for the whole batch and is left out of the individual responses
+                future.set_result({name: value for name, value in nim_response.items() if name not in ("data", "usage")} | {"data": data})
+
+
+class PassthroughResponse(StreamingResponse):
+    """Streamed response running on_close once it has been sent, failed or been cancelled by a disconnect."""
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # HTTP/2 is negotiated on https endpoints, plain http endpoints keep using HTTP/1.1 keep-alive connections
+    app.state.client = httpx.AsyncClient(
+        http2=NIM_PROXY_HTTP2,
+        limits=httpx.Limits(
+            max_connections=NIM_PROXY_MAX_CONNECTIONS,
+            max_keepalive_connections=NIM_PROXY_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=NIM_PROXY_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(NIM_PROXY_TIMEOUT, connect=NIM_PROXY_CONNECT_TIMEOUT),
+    )
+    app.state.scheduler = LaneScheduler(NIM_PROXY_MAX_INFLIGHT, {
+        INTERACTIVE_LANE: (NIM_PROXY_INTERACTIVE_WEIGHT, NIM_PROXY_MAX_INFLIGHT),
+        BULK_LANE: (NIM_PROXY_BULK_WEIGHT, NIM_PROXY_BULK_MAX_INFLIGHT),
+    })
+    app.state.embedding_upstream = UpstreamPool("embedding", NIM_EMBEDDING_URL, app.state.client)
+    app.state.reranker_upstream = UpstreamPool("reranker", NIM_RERANKER_URL, app.state.client)
+    app.state.embedding_batcher = EmbeddingBatcher(
+        app.state.embedding_upstream, app.state.scheduler, NIM_PROXY_EMBEDDING_BATCH_SIZE, NIM_PROXY_EMBEDDING_BATCH_WAIT_MS
+    )
+    yield
+    await app.state.client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/v1/embeddings")
 async def embeddings(request: Request):
     payload = await request.json()
+    lane = get_lane(request, payload)
     payload.setdefault("input_type", "query")
 
-    async with httpx.AsyncClient() as client:
+    inputs = payload.get("input")
+    batch_size = len(inputs) if isinstance(inputs, list) else 1
+    if NIM_PROXY_EMBEDDING_BATCH_SIZE > 1 and isinstance(inputs, (str, list)) and batch_size < NIM_PROXY_EMBEDDING_BATCH_SIZE:
+        return await request.app.state.embedding_batcher.embed(payload, lane)
+
+    # Requests filling a batch on their own are passed through, holding their slot until the body is sent
+    client = request.app.state.client
+    scheduler = request.app.state.scheduler
+    upstream = request.app.state.embedding_upstream
+    await scheduler.acquire(lane)
+    replica = upstream.acquire()
+    start_time = time.perf_counter()
+    try:
+        resp = await client.send(client.build_request("POST", replica.url, json=payload), stream=True)
+    except asyncio.CancelledError:
+        # The client disconnected, which says nothing about the replica
+        upstream.cancel(replica)
+        scheduler.release(lane)
+        raise
+    except Exception:
+        upstream.release(replica, time.perf_counter() - start_time, succeeded=False)
+        scheduler.release(lane)
+        raise
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        await resp.aread()
+        await resp.aclose()
+        upstream.release(replica, time.perf_counter() - start_time, succeeded=resp.status_code < 500)
+        scheduler.release(lane)
+        log.error(f"NIM embedding error: {e.response.text}")
+        raise
+
+    # Stays cancelled if the client disconnects before the whole body is sent
+    outcome = "cancelled"
+
+    async def stream_body():
+        nonlocal outcome
         try:
-            resp = await client.post(NIM_EMBEDDING_URL, json=payload)
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            log.error(f"NIM embedding error: {e.response.text}")
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except Exception:
+            outcome = "failed"
             raise
-        return resp.json()
+        outcome = "succeeded"
+
+    async def end_call():
+        await resp.aclose()
+        if outcome == "cancelled":
+            upstream.cancel(replica)
+        else:
+            upstream.release(replica, time.perf_counter() - start_time, succeeded=outcome == "succeeded")
+        scheduler.release(lane)
+
+    # The embeddings are returned unchanged, so the body is streamed through without decoding it
+    return PassthroughResponse(
+        stream_body(),
+        end_call,
+        status_code=resp.status_code,
+        headers={name: resp.headers[name] for name in PASSTHROUGH_HEADERS if name in resp.headers},
+    )
 
 
 @app.post("/v1/ranking")
@@ -60,15 +472,16 @@ async def rerank(request: Request, authorization: str = Header(None)):
         lengths = [len(p) for p in passages_raw]
         log.debug(f"Passage count: {len(lengths)}, Avg: {sum(lengths)/len(lengths):.1f}, Max: {max(lengths)}")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(NIM_RERANKER_URL, json=payload)
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            log.error(f"NIM reranker error: {e.response.text}")
-            raise
+    try:
+        lane = get_lane(request, {})
+        async with request.app.state.scheduler.slot(lane):
+            resp = await request.app.state.reranker_upstream.post(payload, hedge=lane == INTERACTIVE_LANE)
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        log.error(f"NIM reranker error: {e.response.text}")
+        raise
 
-        nim_response = resp.json()
+    nim_response = resp.json()
 
     if "rankings" in nim_response:
         rankings = nim_response["rankings"]
@@ -88,3 +501,31 @@ async def rerank(request: Request, authorization: str = Header(None)):
         status_code=500,
         content={"error": "NIM reranker did not return expected 'rankings'"}
     )
+
+
+@app.get("/metrics")
+async def lane_metrics(request: Request):
+    """Queue depth, calls in flight and requests of each priority lane in Prometheus text format"""
+    scheduler = request.app.state.scheduler
+    lines = []
+    for name, description, metric_type, value in (
+        ("nim_proxy_lane_queue_depth", "Requests waiting for a call slot", "gauge", scheduler.queue_depth),
+        ("nim_proxy_lane_inflight", "Calls to the NIMs in flight", "gauge", scheduler.inflight.get),
+        ("nim_proxy_lane_requests_total", "Calls scheduled", "counter", scheduler.requests.get),
+    ):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+        lines += [f'{name}{{lane="{lane}"}} {value(lane)}' for lane in scheduler.lanes]
+    upstreams = (request.app.state.embedding_upstream, request.app.state.reranker_upstream)
+    for name, description, metric_type, value in (
+        ("nim_proxy_replica_outstanding", "Calls in flight to the replica", "gauge", lambda replica: replica.outstanding),
+        ("nim_proxy_replica_ejected", "Whether the replica is ejected from balancing", "gauge",
+         lambda replica: int(replica.is_ejected(time.monotonic()))),
+    ):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+        lines += [
+            f'{name}{{upstream="{upstream.name}",replica="{replica.url}"}} {value(replica)}'
+            for upstream in upstreams for replica in upstream.replicas
+        ]
+    lines += ["# HELP nim_proxy_hedged_requests_total Calls duplicated to a second replica", "# TYPE nim_proxy_hedged_requests_total counter"]
+    lines += [f'nim_proxy_hedged_requests_total{{upstream="{upstream.name}"}} {upstream.hedged_requests}' for upstream in upstreams]
+    return PlainTextResponse("\n".join(lines) + "\n")
@@ -0,0 +1,253 @@
+"""
+Stand-in for the embedding, ranking and LLM NIMs, used to load-test and profile the
+rag-server and ingestor-server on machines without GPUs.
+
+Responses are deterministic: embeddings are hashed bag-of-words vectors, ranking logits
+are lexical overlap scores and chat completions stream a canned answer. Latency, token
+rate and error injection are configured through environment variables, e.g.
+
+    NIM_STUB_CHAT_LATENCY=lognormal:300,0.5   # time to first token in ms
+    NIM_STUB_EMBEDDING_LATENCY=fixed:20
+    NIM_STUB_EMBEDDING_LATENCY_PER_ITEM_MS=2
+    NIM_STUB_TOKENS_PER_SECOND=40
+    NIM_STUB_ERROR_RATE=0.01
+
+Latency specs are one of fixed:<ms>, uniform:<min_ms>,<max_ms>, normal:<mean_ms>,<std_ms>
+or lognormal:<median_ms>,<sigma>.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import logging
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.status import HTTP_400_BAD_REQUEST
+
+# Configure logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=getattr(logging, LOG_LEVEL))
+log = logging.getLogger("nim-stub")
+
+EMBEDDING_DIMENSIONS = int(os.getenv("NIM_STUB_EMBEDDING_DIM", 2048))
+TOKENS_PER_SECOND = float(os.getenv("NIM_STUB_TOKENS_PER_SECOND", 50))
+COMPLETION_TOKENS = int(os.getenv("NIM_STUB_COMPLETION_TOKENS", 128))
+ERROR_STATUS = int(os.getenv("NIM_STUB_ERROR_STATUS", 503))
+CANNED_ANSWER = os.getenv(
+    "NIM_STUB_ANSWER",
+    "Based on the provided context, the answer is summarized below. "
+    "The documents describe the relevant details and the key facts are listed in order of importance."
+)
+
+# Seeded so that latencies and injected errors are reproducible between runs
+RANDOM = random.Random(int(os.getenv("NIM_STUB_SEED", 0)))
+TOKEN_PATTERN = re.compile(r"\w+")
+
+app = FastAPI()
+
+
+def _parse_latency(spec: str):
+    """Parse a latency spec into a function returning a latency in seconds"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: RANDOM.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, RANDOM.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        return lambda: RANDOM.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unsupported latency spec: {spec}")
+
+
+class EndpointProfile:
+    """Latency and error injection settings of a single stubbed endpoint"""
+
+    def __init__(self, name: str, default_latency: str):
+        prefix = f"NIM_STUB_{name.upper()}"
+        self.name = name
+        self.latency = _parse_latency(os.getenv(f"{prefix}_LATENCY", default_latency))
+        self.latency_per_item = float(os.getenv(f"{prefix}_LATENCY_PER_ITEM_MS", 0)) / 1000
+        self.error_rate = float(os.getenv(f"{prefix}_ERROR_RATE", os.getenv("NIM_STUB_ERROR_RATE", 0)))
+
+    async def wait(self, num_items: int = 1) -> None:
+        """Sleep for a sampled latency of the endpoint"""
+        await asyncio.sleep(self.latency() + self.latency_per_item * num_items)
+
+    def injected_error(self):
+        """Return an error response if an error should be injected, otherwise None"""
+        if self.error_rate and RANDOM.random() < self.error_rate:
+            log.info("Injecting error in %s", self.name)
+            return JSONResponse(status_code=ERROR_STATUS, content={"error": f"Injected {self.name} failure"})
+        return None
+
+
+EMBEDDING_PROFILE = EndpointProfile("embedding", "fixed:20")
+RANKING_PROFILE = EndpointProfile("ranking", "fixed:30")
+CHAT_PROFILE = EndpointProfile("chat", "lognormal:250,0.3")
+
+
+def _tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _hashed_embedding(text: str) -> List[float]:
+    """Deterministic bag-of-words embedding using signed feature hashing"""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for token in _tokenize(text) or [""]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % EMBEDDING_DIMENSIONS] += 1.0 if (value >> 63) & 1 else -1.0
+    norm = math.sqrt(sum(component * component for component in vector)) or 1.0
+    return [component / norm for component in vector]
+
+
+def _lexical_logit(query: str, passage: str) -> float:
+    """Fraction of query terms present in the passage, mapped to a logit"""
+    query_tokens = set(_tokenize(query))
+    if not query_tokens:
+        return -10.0
+    overlap = len(query_tokens & set(_tokenize(passage))) / len(query_tokens)
+    return 20 * overlap - 10
+
+
+def _completion_tokens(payload: dict) -> List[str]:
+    """Canned answer as a list of tokens, limited by max_tokens"""
+    words = CANNED_ANSWER.split()
+    num_tokens = min(COMPLETION_TOKENS, int(payload.get("max_tokens") or COMPLETION_TOKENS))
+    return [(" " if i else "") + words[i % len(words)] for i in range(num_tokens)]
+
+
+def _usage(payload: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(_tokenize(str(message.get("content", "")))) for message in payload.get("messages", []))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+@app.get("/v1/health/ready")
+@app.get("/v1/health/live")
+@app.get("/v1/health")
+async def health():
+    return {"object": "health-response", "message": "Service is ready."}
+
+
+@app.get("/v1/models")
+async def models():
+    model = os.getenv("NIM_STUB_MODEL_NAME", "nim-stub")
+    return {"object": "list", "data": [{"id": model, "object": "model", "owned_by": "nim-stub"}]}
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    payload = await request.json()
+    inputs = payload.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    await EMBEDDING_PROFILE.wait(len(inputs))
+    error = EMBEDDING_PROFILE.injected_error()
+    if error:
+        return error
+
+    num_tokens = sum(len(_tokenize(text)) for text in inputs)
+    return {
+        "object": "list",
+        "model": payload.get("model", "nim-stub"),
+        "data": [
+            {"index": index, "object": "embedding", "embedding": _hashed_embedding(text)}
+            for index, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": num_tokens, "total_tokens": num_tokens}
+    }
+
+
+@app.post("/v1/ranking")
+async def ranking(request: Request):
+    payload = await request.json()
+    if "query" not in payload or "passages" not in payload:
+        return JSONResponse(
+            status_code=HTTP_400_BAD_REQUEST,
+            content={"error": "Missing required fields: 'query' and 'passages'"}
+        )
+
+    passages = payload["passages"]
+    await RANKING_PROFILE.wait(len(passages))
+    error = RANKING_PROFILE.injected_error()
+    if error:
+        return error
+
+    query = payload["query"].get("text", "")
+    rankings = [
+        {"index": index, "logit": _lexical_logit(query, passage.get("text", ""))}
+        for index, passage in enumerate(passages)
+    ]
+    return {"rankings": sorted(rankings, key=lambda ranking: ranking["logit"], reverse=True)}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    completion_id = f"chatcmpl-{uuid.uuid4()}"
+    created = int(time.time())
+    model = payload.get("model", "nim-stub")
+    tokens = _completion_tokens(payload)
+
+    # Time to first token
+    await CHAT_PROFILE.wait()
+    error = CHAT_PROFILE.injected_error()
+    if error:
+        return error
+
+    if not payload.get("stream"):
+        await asyncio.sleep(len(tokens) / TOKENS_PER_SECOND)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "length" if len(tokens) == payload.get("max_tokens") else "stop"
+            }],
+            "usage": _usage(payload, len(tokens))
+        }
+
+    include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+
+    def _chunk(delta: dict, finish_reason=None, usage=None) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        }
+        if usage is not None:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def _stream():
+        yield _chunk({"role": "assistant", "content": ""})
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(1 / TOKENS_PER_SECOND)
+            yield _chunk({"content": token})
+        yield _chunk({}, finish_reason="length" if len(tokens) == payload.get("max_tokens") else "stop")
+        if include_usage:
+            yield _chunk({}, usage=_usage(payload, len(tokens)))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
@@ -14,24 +14,38 @@
 # limitations under the License.
 
 import logging
+import multiprocessing
 import os
 import requests
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
 from traceback import print_exc
 from typing import Any, Iterable
+from typing import Callable
 from typing import Dict
 from typing import Generator
 from typing import List
+from typing import Optional
 
 from langchain_nvidia_ai_endpoints.callbacks import get_usage_callback
 from langchain_community.document_loaders import UnstructuredFileLoader
+from langchain_core.documents import Document
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain_core.prompts import MessagesPlaceholder
 from langchain_core.prompts.chat import ChatPromptTemplate
 from langchain_core.runnables import RunnableAssign
-from langchain_core.runnables import RunnablePassthrough
 from requests import ConnectTimeout
 
 from .base import BaseExample
+from .circuit_breaker import ENABLE_CIRCUIT_BREAKERS
+from .circuit_breaker import QUERY_REWRITER_BREAKER
+from .circuit_breaker import REFLECTION_BREAKER
+from .circuit_breaker import RERANKER_BREAKER
+from .circuit_breaker import CircuitBreaker
+from .circuit_breaker import record_request_degradation
+from .utils import add_documents_pipelined
 from .utils import create_vectorstore_langchain
 from .utils import get_config
 from .utils import get_embedding_model
@@ -40,8 +54,11 @@ from .utils import get_prompts
 from .utils import get_ranking_model
 from .utils import get_text_splitter
 from .utils import get_vectorstore
+from .utils import load_and_split_document
 from .utils import format_document_with_source
 from .utils import streaming_filter_think, get_streaming_filter_think_parser
+from .observability.request_timings import TimedEmbeddings, record_request_timing
+from .request_deadline import deadline_stage, request_time_fits
 from .reflection import ReflectionCounter, check_context_relevance, check_response_groundedness
 from .utils import normalize_relevance_scores
 
@@ -56,6 +73,11 @@ logger.info("Query rewriter llm config: model name %s, url %s, config %s", setti
 query_rewriter_llm = get_llm(model=settings.query_rewriter.model_name, url=settings.query_rewriter.server_url, **query_rewriter_llm_config)
 prompts = get_prompts()
 vdb_top_k = int(os.environ.get("VECTOR_DB_TOPK", 40))
+# Number of worker processes parsing and splitting files for ingestion without nv-ingest
+unstructured_ingestion_workers = int(os.environ.get("UNSTRUCTURED_INGESTION_WORKERS", os.cpu_count() or 1))
+# Number of chunks embedded and added to the vectorstore in a single call during ingestion without nv-ingest
+unstructured_vdb_upload_bulk_size = int(os.environ.get("UNSTRUCTURED_VDB_UPLOAD_BULK_SIZE", 500))
+INGESTION_PROCESS_POOL = None
 
 try:
     VECTOR_STORE = create_vectorstore_langchain(document_embedder=document_embedder)
@@ -75,8 +97,138 @@ class APIError(Exception):
         self.code = code
         super().__init__(message)
 
+def _get_ingestion_process_pool() -> ProcessPoolExecutor:
+    """Return the process pool used to parse and split files, created on first use.
+    Workers are spawned rather than forked since the server process runs threads.
+    """
+    global INGESTION_PROCESS_POOL  # pylint: disable=W0603
+    if INGESTION_PROCESS_POOL is None:
+        INGESTION_PROCESS_POOL = ProcessPoolExecutor(
+            max_workers=max(1, unstructured_ingestion_workers),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return INGESTION_PROCESS_POOL
+
 class UnstructuredRAG(BaseExample):
 
+    def __init__(self, metrics=None):
+        # OtelMetrics instance used to record per stage latencies, None if tracing is disabled
+        self.metrics = metrics
+
+    def _record_stage(self, stage: str, duration: float, attributes: Dict[str, str]):
+        """Record a pipeline stage duration to metrics, when enabled, and to the request timings"""
+        if self.metrics is not None:
+            self.metrics.record_stage_duration(stage, duration, attributes)
+        record_request_timing(stage, duration)
+
+    @contextmanager
+    def _time_stage(self, stage: str, attributes: Dict[str, str]):
+        """Time the enclosed pipeline stage"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_stage(stage, time.perf_counter() - start_time, attributes)
+
+    def _get_embedding_model(self, attributes: Dict[str, str], **kwargs) -> TimedEmbeddings:
+        """Get the embedding model, wrapped to record the embedding stage"""
+        document_embedder = get_embedding_model(model=kwargs.get("embedding_model"), url=kwargs.get("embedding_endpoint"))
+        return TimedEmbeddings(document_embedder, lambda duration: self._record_stage("embedding", duration, attributes))
+
+    @contextmanager
+    def _time_vector_search(self, document_embedder: TimedEmbeddings, attributes: Dict[str, str]):
+        """Time a retrieval call as the vector_search stage, excluding the query embedding time"""
+        start_time, embedding_elapsed = time.perf_counter(), document_embedder.elapsed
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time - (document_embedder.elapsed - embedding_elapsed)
+            self._record_stage("vector_search", duration, attributes)
+
+    def _degrade(self, dependency: str, reason: str, attributes: Dict[str, str]):
+        """Record that the request is answered without the given dependency"""
+        logger.warning("Continuing without %s, reason: %s", dependency, reason)
+        if self.metrics is not None:
+            self.metrics.record_degradation(dependency, reason, attributes)
+        record_request_degradation(dependency)
+
+    def _call_with_breaker(self, breaker: CircuitBreaker, stage: str, function: Callable[[], Any], attributes: Dict[str, str]) -> Optional[Any]:
+        """Call an auxiliary model through its circuit breaker, timed as the given stage.
+        The call is skipped if it is not expected to complete before the request deadline, and its HTTP calls
+        time out at the deadline.
+        Returns None if the call was skipped or failed, in which case the caller continues without the dependency.
+        """
+        if not request_time_fits(breaker.expected_latency):
+            self._degrade(breaker.name, "deadline", attributes)
+            return None
+
+        if not breaker.allow():
+            self._degrade(breaker.name, "circuit_open", attributes)
+            return None
+        with deadline_stage():
+            return self._record_breaker_call(breaker, stage, function, attributes)
+
+    def _record_breaker_call(self, breaker: CircuitBreaker, stage: str, function: Callable[[], Any], attributes: Dict[str, str]) -> Optional[Any]:
+        """Make a call allowed by the breaker, recording its outcome and duration"""
+        start_time = time.perf_counter()
+        succeeded = False
+        try:
+            result = function()
+            succeeded = True
+            return result
+        except Exception as e:
+            if not request_time_fits(0):
+                # A timeout at the deadline counts as a failure and its cut short duration is no latency sample,
+                # so a dependency that keeps running into deadlines opens its breaker
+                self._degrade(breaker.name, "deadline", attributes)
+                return None
+            if not ENABLE_CIRCUIT_BREAKERS:
+                raise
+            logger.warning("Call to %s failed: %s", breaker.name, e)
+            self._degrade(breaker.name, "error", attributes)
+            return None
+        finally:
+            duration = time.perf_counter() - start_time
+            breaker.record(duration, succeeded)
+            self._record_stage(stage, duration, attributes)
+
+    def _retrieve(
+        self,
+        retriever_query: str,
+        retriever,
+        ranker,
+        reranker_top_k: int,
+        document_embedder: TimedEmbeddings,
+        attributes: Dict[str, str],
+    ) -> List[Document]:
+        """Retrieve documents for the query and rerank them if a ranker is given.
+        If the reranker is skipped by its circuit breaker, the vector search results are truncated to reranker_top_k.
+        """
+        with self._time_vector_search(document_embedder, attributes):
+            docs = retriever.invoke(retriever_query, config={"run_name": "retriever"})
+        if not ranker:
+            return docs
+
+        context_reranker = RunnableAssign({
+            "context": lambda input: ranker.compress_documents(query=input["question"], documents=input["context"])
+        })
+        reranked = self._call_with_breaker(
+            RERANKER_BREAKER,
+            "rerank",
+            lambda: context_reranker.invoke({"context": docs, "question": retriever_query}, config={"run_name": "context_reranker"}),
+            attributes,
+        )
+        if reranked is None:
+            return docs[:reranker_top_k]
+        # Normalize scores to 0-1 range
+        return normalize_relevance_scores(reranked.get("context", []))
+
+    @staticmethod
+    def _combine_user_queries(messages: List, query: str) -> str:
+        """Use previous user queries and current query to form a single query for document retrieval"""
+        user_queries = [msg.content for msg in messages if msg.role == "user"]
+        return ". ".join([*user_queries, query])
+
     def ingest_docs(self, data_dir: str, filename: str, collection_name: str = "", vdb_endpoint: str = "") -> None:
         """Ingests documents to the VectorDB.
         It's called when the POST endpoint of `/documents` API is invoked.
@@ -110,23 +262,78 @@ class UnstructuredRAG(BaseExample):
             else:
                 logger.warning("No documents available to process!")
 
-        except ConnectTimeout as e:
+        except Exception as e:
+            self._raise_api_error(e)
+
+    def ingest_docs_batch(self, filepaths: List[str], collection_name: str = "", vdb_endpoint: str = "") -> Dict[str, str]:
+        """Ingests multiple documents to the VectorDB.
+        Files are parsed and split in parallel by the ingestion process pool, while the resulting chunks are
+        embedded and added to the vectorstore in bulks of UNSTRUCTURED_VDB_UPLOAD_BULK_SIZE by the calling thread.
+
+        Args:
+            filepaths (List[str]): The paths to the document files.
+            collection_name (str): The name of the collection to be created in the vectorstore.
+
+        Returns:
+            Dict[str, str]: Filepaths which could not be parsed mapped to the error.
+
+        Raises:
+            APIError: If there's an error while embedding or adding documents to the vectorstore.
+        """
+        futures = {
+            _get_ingestion_process_pool().submit(load_and_split_document, filepath): filepath
+            for filepath in filepaths
+        }
+        failed_filepaths = {}
+        pending_documents = []
+        vs = None
+        try:
+            for future in as_completed(futures):
+                filepath = futures[future]
+                try:
+                    pending_documents.extend(future.result())
+                except Exception as e:
+                    logger.error("Failed to parse and split %s: %s", filepath, e)
+                    failed_filepaths[filepath] = str(e)
+                    continue
+
+                # Add full bulks to vectorstore while remaining files are parsed
+                while len(pending_documents) >= unstructured_vdb_upload_bulk_size:
+                    if vs is None:
+                        vs = get_vectorstore(document_embedder, collection_name, vdb_endpoint)
+                    add_documents_pipelined(vs, pending_documents[:unstructured_vdb_upload_bulk_size])
+                    pending_documents = pending_documents[unstructured_vdb_upload_bulk_size:]
+
+            if pending_documents:
+                if vs is None:
+                    vs = get_vectorstore(document_embedder, collection_name, vdb_endpoint)
+                add_documents_pipelined(vs, pending_documents)
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            self._raise_api_error(e)
+
+        return failed_filepaths
+
+    @staticmethod
+    def _raise_api_error(e: Exception) -> None:
+        """Raise an APIError corresponding to an exception raised during document ingestion."""
+        if isinstance(e, ConnectTimeout):
             raise APIError(
                 "Connection timed out while accessing the embedding model endpoint. Verify server availability.",
                 code=504
             ) from e
-        except Exception as e:
-            if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
-                raise APIError(
-                    "Authentication or permission error: Verify NVIDIA API key validity and permissions.",
-                    code=403
-                ) from e
-            if "[404] Not Found" in str(e):
-                raise APIError(
-                    "API endpoint or payload is invalid. Ensure the model name is valid.",
-                    code=404
-                ) from e
-            raise APIError("Failed to upload document. " + str(e), code=500) from e
+        if "[403] Forbidden" in str(e) and "Invalid UAM response" in str(e):
+            raise APIError(
+                "Authentication or permission error: Verify NVIDIA API key validity and permissions.",
+                code=403
+            ) from e
+        if "[404] Not Found" in str(e):
+            raise APIError(
+                "API endpoint or payload is invalid. Ensure the model name is valid.",
+                code=404
+            ) from e
+        raise APIError("Failed to upload document. " + str(e), code=500) from e
 
     @staticmethod
     def flatten_messages(system_prompt: str, chat_history: List[tuple], user_query: str) -> str:
@@ -173,13 +380,15 @@ class UnstructuredRAG(BaseExample):
             model_name = os.getenv("APP_LLM_MODELNAME", "").lower()
 
             llm = get_llm(**kwargs)
+            # Labels of the token metrics recorded by the tracing callback handler
+            stage_attributes = {"endpoint": "/generate", "collection": "", "model": kwargs.get("model") or ""}
 
             if model_name.startswith("google"):
                 logger.info("Detected Google model - flattening messages for LLM input.")
                 final_prompt = self.flatten_messages(system_prompt, conversation_history, query)
                 
                 chain = llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream(final_prompt, config={'run_name': 'llm-stream'})
+                return chain.stream(final_prompt, config={'run_name': 'llm-stream', 'metadata': stage_attributes})
             else:
                 logger.info("Detected non-Google model - using ChatPromptTemplate with roles.")
                 message = [("system", system_prompt)] + conversation_history + user_message
@@ -188,7 +397,7 @@ class UnstructuredRAG(BaseExample):
 
                 prompt_template = ChatPromptTemplate.from_messages(message)
                 chain = prompt_template | llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream({"question": query}, config={'run_name': 'llm-stream'})
+                return chain.stream({"question": query}, config={'run_name': 'llm-stream', 'metadata': stage_attributes})
 
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
@@ -222,7 +431,8 @@ class UnstructuredRAG(BaseExample):
         try:
             logger.info("Using rag to generate response from document for the query: %s", query)
 
-            document_embedder = get_embedding_model(model=kwargs.get("embedding_model"), url=kwargs.get("embedding_endpoint"))
+            stage_attributes = {"endpoint": "/generate", "collection": collection_name, "model": kwargs.get("model") or ""}
+            document_embedder = self._get_embedding_model(stage_attributes, **kwargs)
             vs = get_vectorstore(document_embedder, collection_name, kwargs.get("vdb_endpoint"))
             if vs is None:
                 raise APIError("Vector store not initialized properly. Please check if the vector DB is up and running.", 500)
@@ -248,14 +458,20 @@ class UnstructuredRAG(BaseExample):
             model_name = os.getenv("APP_LLM_MODELNAME", "").lower()
 
             # Get relevant documents
+            reflection_result = None
             if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
                 max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
                 reflection_counter = ReflectionCounter(max_loops)
 
-                context_to_show, is_relevant = check_context_relevance(
-                    query, retriever, ranker, reflection_counter
+                reflection_result = self._call_with_breaker(
+                    REFLECTION_BREAKER,
+                    "reflection",
+                    lambda: check_context_relevance(query, retriever, ranker, reflection_counter),
+                    stage_attributes,
                 )
 
+            if reflection_result is not None:
+                context_to_show, is_relevant = reflection_result
                 if not is_relevant:
                     logger.warning("Could not find sufficiently relevant context after maximum attempts")
             else:
@@ -266,18 +482,9 @@ class UnstructuredRAG(BaseExample):
                         reranker_top_k,
                     )
                     logger.info("Setting ranker top n as: %s.", reranker_top_k)
-
-                    context_reranker = RunnableAssign({
-                        "context": lambda input: ranker.compress_documents(query=input["question"], documents=input["context"])
-                    })
-
-                    retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
-                    docs = retriever.invoke(query, config={"run_name": "retriever"})
-                    docs = context_reranker.invoke({"context": docs.get("context", []), "question": query}, config={"run_name": "context_reranker"})
-                    context_to_show = docs.get("context", [])
-                    context_to_show = normalize_relevance_scores(context_to_show)
-                else:
-                    context_to_show = retriever.invoke(query)
+                context_to_show = self._retrieve(
+                    query, retriever, ranker if kwargs.get("enable_reranker") else None, reranker_top_k, document_embedder, stage_attributes
+                )
 
             docs = [format_document_with_source(d) for d in context_to_show]
 
@@ -289,7 +496,7 @@ class UnstructuredRAG(BaseExample):
                 final_prompt += f"\n\nContext:\n{context_text}"
 
                 chain = llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream(final_prompt, config={"run_name": "llm-stream"}), context_to_show
+                return chain.stream(final_prompt, config={"run_name": "llm-stream", "metadata": stage_attributes}), context_to_show
             else:
                 logger.info("Detected non-Google model - using ChatPromptTemplate with roles.")
                 message = [("system", system_prompt)] + conversation_history + [("user", "{question}")]
@@ -298,7 +505,7 @@ class UnstructuredRAG(BaseExample):
 
                 prompt_template = ChatPromptTemplate.from_messages(message)
                 chain = prompt_template | llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream({"question": query, "context": docs}, config={"run_name": "llm-stream"}), context_to_show
+                return chain.stream({"question": query, "context": docs}, config={"run_name": "llm-stream", "metadata": stage_attributes}), context_to_show
 
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
@@ -332,7 +539,8 @@ class UnstructuredRAG(BaseExample):
         try:
             logger.info("Using multiturn rag to generate response from document for the query: %s", query)
 
-            document_embedder = get_embedding_model(model=kwargs.get("embedding_model"), url=kwargs.get("embedding_endpoint"))
+            stage_attributes = {"endpoint": "/generate", "collection": collection_name, "model": kwargs.get("model") or ""}
+            document_embedder = self._get_embedding_model(stage_attributes, **kwargs)
             vs = get_vectorstore(document_embedder, collection_name, kwargs.get("vdb_endpoint"))
             if vs is None:
                 raise APIError("Vector store not initialized properly. Please check if the vector DB is up and running.", 500)
@@ -374,24 +582,37 @@ class UnstructuredRAG(BaseExample):
                         ("human", "{input}"),
                     ])
                     q_prompt = contextualize_q_prompt | query_rewriter_llm | StreamingFilterThinkParser | StrOutputParser()
-                    retriever_query = q_prompt.invoke({"input": query, "chat_history": conversation_history}, config={"run_name": "query-rewriter"})
+                    retriever_query = self._call_with_breaker(
+                        QUERY_REWRITER_BREAKER,
+                        "query_rewrite",
+                        lambda: q_prompt.invoke({"input": query, "chat_history": conversation_history}, config={"run_name": "query-rewriter"}),
+                        stage_attributes,
+                    )
+                    if retriever_query is None:
+                        retriever_query = self._combine_user_queries(chat_history, query)
+                        logger.info("Combined retriever query: %s", retriever_query)
                     logger.info("Rewritten Query: %s", retriever_query)
                     if retriever_query.replace('"', "'") == "''" or len(retriever_query.strip()) == 0:
                         return iter([""]), []
                 else:
-                    user_queries = [msg.content for msg in chat_history if msg.role == "user"]
-                    retriever_query = ". ".join([*user_queries, query])
+                    retriever_query = self._combine_user_queries(chat_history, query)
                     logger.info("Combined retriever query: %s", retriever_query)
 
             # Retrieve documents
+            reflection_result = None
             if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
                 max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
                 reflection_counter = ReflectionCounter(max_loops)
 
-                context_to_show, is_relevant = check_context_relevance(
-                    retriever_query, retriever, ranker, reflection_counter
+                reflection_result = self._call_with_breaker(
+                    REFLECTION_BREAKER,
+                    "reflection",
+                    lambda: check_context_relevance(retriever_query, retriever, ranker, reflection_counter),
+                    stage_attributes,
                 )
 
+            if reflection_result is not None:
+                context_to_show, is_relevant = reflection_result
                 if not is_relevant:
                     logger.warning("Could not find sufficiently relevant context after %d reflection attempts", reflection_counter.current_count)
             else:
@@ -401,17 +622,9 @@ class UnstructuredRAG(BaseExample):
                         top_k,
                         reranker_top_k,
                     )
-                    context_reranker = RunnableAssign({
-                        "context": lambda input: ranker.compress_documents(query=input["question"], documents=input["context"])
-                    })
-                    retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
-                    docs = retriever.invoke(retriever_query, config={"run_name": "retriever"})
-                    docs = context_reranker.invoke({"context": docs.get("context", []), "question": retriever_query}, config={"run_name": "context_reranker"})
-                    context_to_show = docs.get("context", [])
-                    context_to_show = normalize_relevance_scores(context_to_show)
-                else:
-                    docs = retriever.invoke(retriever_query, config={"run_name": "retriever"})
-                    context_to_show = docs
+                context_to_show = self._retrieve(
+                    retriever_query, retriever, ranker if kwargs.get("enable_reranker") else None, reranker_top_k, document_embedder, stage_attributes
+                )
 
             docs = [format_document_with_source(d) for d in context_to_show]
 
@@ -423,7 +636,7 @@ class UnstructuredRAG(BaseExample):
                 final_prompt += f"\n\nContext:\n{context_text}"
 
                 chain = llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream(final_prompt, config={"run_name": "llm-stream"}), context_to_show
+                return chain.stream(final_prompt, config={"run_name": "llm-stream", "metadata": stage_attributes}), context_to_show
             else:
                 logger.info("Detected non-Google model - using ChatPromptTemplate for multi-turn RAG.")
 
@@ -433,7 +646,7 @@ class UnstructuredRAG(BaseExample):
 
                 prompt_template = ChatPromptTemplate.from_messages(message)
                 chain = prompt_template | llm | StreamingFilterThinkParser | StrOutputParser()
-                return chain.stream({"question": query, "context": docs}, config={"run_name": "llm-stream"}), context_to_show
+                return chain.stream({"question": query, "context": docs}, config={"run_name": "llm-stream", "metadata": stage_attributes}), context_to_show
 
         except ConnectTimeout as e:
             logger.warning("Connection timed out while making a request to the LLM endpoint: %s", e)
@@ -466,7 +679,8 @@ class UnstructuredRAG(BaseExample):
         logger.info("Searching relevant document for the query: %s", content)
 
         try:
-            document_embedder = get_embedding_model(model=kwargs.get("embedding_model"), url=kwargs.get("embedding_endpoint"))
+            stage_attributes = {"endpoint": "/search", "collection": collection_name, "model": kwargs.get("embedding_model") or ""}
+            document_embedder = self._get_embedding_model(stage_attributes, **kwargs)
             vs = get_vectorstore(document_embedder, collection_name, kwargs.get("vdb_endpoint"))
             if vs is None:
                 logger.error("Vector store not initialized properly. Please check if the vector db is up and running")
@@ -506,48 +720,50 @@ class UnstructuredRAG(BaseExample):
                     q_prompt = contextualize_q_prompt | query_rewriter_llm | StreamingFilterThinkParser | StrOutputParser()
                     # query to be used for document retrieval
                     logger.info("Query rewriter prompt: %s", contextualize_q_prompt)
-                    retriever_query = q_prompt.invoke({"input": content, "chat_history": conversation_history})
+                    retriever_query = self._call_with_breaker(
+                        QUERY_REWRITER_BREAKER,
+                        "query_rewrite",
+                        lambda: q_prompt.invoke({"input": content, "chat_history": conversation_history}),
+                        stage_attributes,
+                    )
+                    if retriever_query is None:
+                        retriever_query = self._combine_user_queries(messages, content)
+                        logger.info("Combined retriever query: %s", retriever_query)
                     logger.info("Rewritten Query: %s %s", retriever_query, len(retriever_query))
                     if retriever_query.replace('"', "'") == "''" or len(retriever_query) == 0:
                         return []
                 else:
-                    # Use previous user queries and current query to form a single query for document retrieval
-                    user_queries = [msg.content for msg in messages if msg.role == "user"]
-                    retriever_query = ". ".join([*user_queries, content])
+                    retriever_query = self._combine_user_queries(messages, content)
                     logger.info("Combined retriever query: %s", retriever_query)
             # Get relevant documents with optional reflection   
             if os.environ.get("ENABLE_REFLECTION", "false").lower() == "true":
                 max_loops = int(os.environ.get("MAX_REFLECTION_LOOP", 3))
                 reflection_counter = ReflectionCounter(max_loops)
-                docs, is_relevant = check_context_relevance(content, retriever, local_ranker, reflection_counter, kwargs.get("enable_reranker"))
-                if not is_relevant:
-                    logger.warning("Could not find sufficiently relevant context after maximum attempts")
-                return docs
-            else:
-                if local_ranker and kwargs.get("enable_reranker"):
-                    logger.info(
-                        "Narrowing the collection from %s results and further narrowing it to %s with the reranker for rag"
-                        " chain.",
-                        top_k,
-                        reranker_top_k)
-                    logger.info("Setting ranker top n as: %s.", reranker_top_k)
-                    # Update number of document to be retriever by ranker
-                    local_ranker.top_n = reranker_top_k
-
-                    context_reranker = RunnableAssign({
-                        "context":
-                            lambda input: local_ranker.compress_documents(query=input['question'],
-                                                                        documents=input['context'])
-                    })
-
-                    retriever = {"context": retriever, "question": RunnablePassthrough()} | context_reranker
-                    docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
-                    # Normalize scores to 0-1 range"
-                    docs = normalize_relevance_scores(docs.get("context", []))
+                reflection_result = self._call_with_breaker(
+                    REFLECTION_BREAKER,
+                    "reflection",
+                    lambda: check_context_relevance(content, retriever, local_ranker, reflection_counter, kwargs.get("enable_reranker")),
+                    stage_attributes,
+                )
+                if reflection_result is not None:
+                    docs, is_relevant = reflection_result
+                    if not is_relevant:
+                        logger.warning("Could not find sufficiently relevant context after maximum attempts")
                     return docs
-            docs = retriever.invoke(retriever_query, config={'run_name':'retriever'})
-            # TODO: Check how to get the relevance score from milvus
-            return docs
+
+            if local_ranker and kwargs.get("enable_reranker"):
+                logger.info(
+                    "Narrowing the collection from %s results and further narrowing it to %s with the reranker for rag"
+                    " chain.",
+                    top_k,
+                    reranker_top_k)
+                logger.info("Setting ranker top n as: %s.", reranker_top_k)
+                # Update number of document to be retriever by ranker
+                local_ranker.top_n = reranker_top_k
+            # TODO: Check how to get the relevance score from milvus when reranker is disabled
+            return self._retrieve(
+                retriever_query, retriever, local_ranker if kwargs.get("enable_reranker") else None, reranker_top_k, document_embedder, stage_attributes
+            )
 
         except Exception as e:
             raise APIError(f"Failed to search documents. {str(e)}") from e
@@ -0,0 +1,145 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Circuit breakers for the auxiliary models of the RAG pipeline (reranker, query rewriter, reflection).
+
+A breaker tracks the latency and outcome of the most recent calls to a dependency. It opens when too many
+of them failed or were slower than the latency threshold, after which the pipeline skips the dependency
+and degrades the answer instead of waiting on it. Once the cooldown has passed, a single trial call is let
+through and closes the breaker again if it succeeds in time.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLE_CIRCUIT_BREAKERS = os.getenv("ENABLE_CIRCUIT_BREAKERS", "True").lower() == "true"
+
+_REQUEST_DEGRADATIONS: ContextVar[Optional[List[str]]] = ContextVar("request_degradations", default=None)
+
+
+class CircuitBreaker:
+    """Rolling window circuit breaker of a single dependency."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        latency_threshold: float,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        # Calls taking longer than this many seconds count as failed
+        self.latency_threshold = latency_threshold
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.cooldown = cooldown
+        # Source of the time in seconds the cooldown is measured with
+        self.clock = clock
+        self.state = self.CLOSED
+        # Exponentially weighted moving average of the call duration in seconds
+        self.expected_latency = 0.0
+        self._calls = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, default_latency_threshold: float) -> "CircuitBreaker":
+        """Create a breaker configured by CIRCUIT_BREAKER_* environment variables.
+        The latency threshold can be set per dependency with CIRCUIT_BREAKER_<NAME>_LATENCY_THRESHOLD."""
+        return cls(
+            name,
+            latency_threshold=float(os.getenv(f"CIRCUIT_BREAKER_{name.upper()}_LATENCY_THRESHOLD", default_latency_threshold)),
+            window_size=int(os.getenv("CIRCUIT_BREAKER_WINDOW_SIZE", 20)),
+            min_calls=int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", 5)),
+            failure_rate_threshold=float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", 0.5)),
+            cooldown=float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", 30)),
+        )
+
+    def allow(self) -> bool:
+        """Return whether a call to the dependency should be made."""
+        if not ENABLE_CIRCUIT_BREAKERS:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.cooldown:
+                logger.info("Circuit breaker %s is half open, trying a single call", self.name)
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half open with the trial call still in flight
+            return False
+
+    def record(self, duration: float, succeeded: bool) -> None:
+        """Record the outcome of a call allowed by allow(), also when the breaker is disabled.
+        Only successful calls update the expected latency."""
+        failed = not succeeded or duration > self.latency_threshold
+        with self._lock:
+            if succeeded:
+                self.expected_latency = duration if not self.expected_latency else 0.8 * self.expected_latency + 0.2 * duration
+            if self.state == self.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    logger.info("Circuit breaker %s closed", self.name)
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append(failed)
+            if self.state == self.CLOSED and len(self._calls) >= self.min_calls:
+                failure_rate = sum(self._calls) / len(self._calls)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+
+    def _open(self) -> None:
+        logger.warning(
+            "Circuit breaker %s opened, skipping calls for %s seconds", self.name, self.cooldown
+        )
+        self.state = self.OPEN
+        self._opened_at = self.clock()
+        self._calls.clear()
+
+
+RERANKER_BREAKER = CircuitBreaker.from_env("reranker", default_latency_threshold=2)
+QUERY_REWRITER_BREAKER = CircuitBreaker.from_env("query_rewriter", default_latency_threshold=3)
+REFLECTION_BREAKER = CircuitBreaker.from_env("reflection", default_latency_threshold=15)
+
+
+def start_request_degradations() -> List[str]:
+    """Start collecting the degradations applied to the current request context."""
+    degradations = []
+    _REQUEST_DEGRADATIONS.set(degradations)
+    return degradations
+
+
+def record_request_degradation(dependency: str) -> None:
+    """Add a skipped dependency to the degradations of the current request, if collected."""
+    degradations = _REQUEST_DEGRADATIONS.get()
+    if degradations is not None and dependency not in degradations:
+        degradations.append(dependency)
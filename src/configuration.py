@@ -332,6 +332,21 @@ class TracingConfig(ConfigWizard):
         default="",
         help_txt=""
     )
+    sample_ratio: float = configfield(
+        "sample_ratio",
+        default=1.0,
+        help_txt="Fraction of requests to trace, sampled at the root span and followed by child spans",
+    )
+    token_events: bool = configfield(
+        "token_events",
+        default=False,
+        help_txt="Add a span event for every streamed LLM token, otherwise only token count and timestamps are recorded",
+    )
+    max_active_spans: int = configfield(
+        "max_active_spans",
+        default=10000,
+        help_txt="Maximum number of unfinished Langchain spans tracked, the oldest are ended once exceeded",
+    )
 
 
 @configclass
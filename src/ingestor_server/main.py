@@ -30,11 +30,13 @@ from datetime import datetime
 from pymilvus import utility, connections
 
 from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
 
 from .base import BaseIngestor
 from src.utils import (
     get_config,
     get_vectorstore,
+    add_documents_pipelined,
     get_embedding_model,
     get_docs_vectorstore_langchain,
     get_nv_ingest_client,
@@ -55,9 +57,14 @@ logger = logging.getLogger(__name__)
 
 SETTINGS = get_config()
 DOCUMENT_EMBEDDER = document_embedder = get_embedding_model(model=SETTINGS.embeddings.model_name, url=SETTINGS.embeddings.server_url)
-NV_INGEST_CLIENT_INSTANCE = get_nv_ingest_client()
 MINIO_OPERATOR = get_minio_operator()
 
+# Number of files submitted to nv-ingest in a single job
+NV_INGEST_FILES_PER_JOB = max(1, int(os.getenv("NV_INGEST_FILES_PER_JOB", 16)))
+# Maximum number of nv-ingest jobs in flight across all requests handled by this server
+NV_INGEST_CONCURRENT_JOBS = max(1, int(os.getenv("NV_INGEST_CONCURRENT_JOBS", 4)))
+NV_INGEST_JOB_SEMAPHORE = asyncio.Semaphore(NV_INGEST_CONCURRENT_JOBS)
+
 class NVIngestIngestor(BaseIngestor):
     """
     Main Class for RAG ingestion pipeline integration for NV-Ingest
@@ -101,10 +108,11 @@ class NVIngestIngestor(BaseIngestor):
             finally:
                 connections.disconnect(connection_alias)
 
-            await self._nv_ingest_ingestion(
+            failed_filepaths = await self._nv_ingest_ingestion(
                 filepaths=filepaths,
                 **kwargs
             )
+            ingested_filepaths = [filepath for filepath in filepaths if filepath not in failed_filepaths]
 
             # Generate response dictionary
             uploaded_documents = [
@@ -113,17 +121,22 @@ class NVIngestIngestor(BaseIngestor):
                     "document_name": os.path.basename(filepath),
                     "size_bytes": os.path.getsize(filepath)
                 }
-                for filepath in filepaths
+                for filepath in ingested_filepaths
             ]
 
              # Get current timestamp in ISO format
             timestamp = datetime.utcnow().isoformat()
             # TODO: Store document_id, timestamp and document size as metadata
 
+            message = "Document upload job successfully completed."
+            if failed_filepaths:
+                message = f"Document upload job completed. {len(failed_filepaths)} of {len(filepaths)} documents failed to ingest, check ingestor-server logs for details."
+
             response_data = {
-                "message": "Document upload job successfully completed.",
-                "total_documents": len(filepaths),
-                "documents": uploaded_documents
+                "message": message,
+                "total_documents": len(ingested_filepaths),
+                "documents": uploaded_documents,
+                "failed_documents": [os.path.basename(filepath) for filepath in failed_filepaths]
             }
 
             return response_data
@@ -148,18 +161,21 @@ class NVIngestIngestor(BaseIngestor):
 
     @staticmethod
     def delete_collections(
-        vdb_endpoint: str, collection_names: List[str],
+        collection_names: List[str], vdb_endpoint: str,
     ) -> Dict[str, Any]:
         """
         Main function called by ingestor server to delete collections in vector-DB
         """
         logger.info(f"Deleting collections {collection_names} at {vdb_endpoint}")
-        response = delete_collections(collection_names, vdb_endpoint)
+        response = delete_collections(vdb_endpoint=vdb_endpoint, collection_names=collection_names)
         # Delete from Minio
-        for collection in collection_names:
-            collection_prefix = get_unique_thumbnail_id_collection_prefix(collection)
-            delete_object_names = MINIO_OPERATOR.list_payloads(collection_prefix)
-            MINIO_OPERATOR.delete_payloads(delete_object_names)
+        collection_prefixes = [
+            get_unique_thumbnail_id_collection_prefix(collection)
+            for collection in collection_names
+        ]
+        failures = MINIO_OPERATOR.delete_payloads_with_prefixes(collection_prefixes)
+        if failures:
+            logger.error(f"Failed to delete {len(failures)} objects from Minio for collections {collection_names}")
         return response
 
 
@@ -245,7 +261,8 @@ class NVIngestIngestor(BaseIngestor):
             vdb_endpoint (str): Vector database endpoint.
 
         Returns:
-            Dict[str, Any]: Response containing a list of deleted documents with metadata.
+            Dict[str, Any]: Response containing a list of deleted documents with metadata
+            and the number of chunks deleted per document, along with the names of documents which were not deleted.
         """
 
         try:
@@ -260,27 +277,45 @@ class NVIngestIngestor(BaseIngestor):
                 raise ValueError("No document names provided for deletion. Please provide document names to delete.")
 
             # TODO: Delete based on document_ids if provided
-            if del_docs_vectorstore_langchain(vs, document_names):
+            deleted_counts = del_docs_vectorstore_langchain(vs, document_names)
+            deleted_document_names = [doc for doc in document_names if (deleted_counts.get(doc) or 0) > 0]
+            failed_document_names = [doc for doc in document_names if doc not in deleted_document_names]
+            unknown_document_names = [doc for doc in document_names if deleted_counts.get(doc, 0) is None]
+            if unknown_document_names:
+                logger.error(f"Deletion of documents {unknown_document_names} from collection {collection_name} failed, they may be partially deleted.")
+            if failed_document_names:
+                logger.info(f"Documents {failed_document_names} were not deleted from collection {collection_name}. Either they do not exist or there was an error while removing them.")
+
+            if deleted_document_names:
                 # Generate response dictionary
                 documents = [
                     {
                         "document_id": "",  # TODO - Use actual document_id
                         "document_name": doc,
-                        "size_bytes": 0 # TODO - Use actual size
+                        "size_bytes": 0, # TODO - Use actual size
+                        "chunks_deleted": deleted_counts[doc]
                     }
-                    for doc in document_names
+                    for doc in deleted_document_names
                 ]
                 # Delete from Minio
-                for doc in document_names:
-                    filename_prefix = get_unique_thumbnail_id_file_name_prefix(collection_name, doc)
-                    delete_object_names = MINIO_OPERATOR.list_payloads(filename_prefix)
-                    MINIO_OPERATOR.delete_payloads(delete_object_names)
-                return {f"message": "Files deleted successfully", "total_documents": len(documents), "documents": documents}
+                filename_prefixes = [
+                    get_unique_thumbnail_id_file_name_prefix(collection_name, doc)
+                    for doc in deleted_document_names
+                ]
+                failures = MINIO_OPERATOR.delete_payloads_with_prefixes(filename_prefixes)
+                if failures:
+                    logger.error(f"Failed to delete {len(failures)} objects from Minio for documents {deleted_document_names}")
+                return {
+                    "message": "Files deleted successfully",
+                    "total_documents": len(documents),
+                    "documents": documents,
+                    "failed_documents": failed_document_names
+                }
 
         except Exception as e:
-            return {f"message": f"Failed to delete files due to error: {e}", "total_documents": 0, "documents": []}
+            return {f"message": f"Failed to delete files due to error: {e}", "total_documents": 0, "documents": [], "failed_documents": document_names}
 
-        return {f"message": "Failed to delete files due to error. Check logs for details.", "total_documents": 0, "documents": []}
+        return {f"message": "Failed to delete files due to error. Check logs for details.", "total_documents": 0, "documents": [], "failed_documents": document_names}
 
     @staticmethod
     def _prepare_metadata(
@@ -377,8 +412,7 @@ class NVIngestIngestor(BaseIngestor):
     def _add_documents_to_vectorstore(
         self,
         documents: List[Document],
-        collection_name: str,
-        vdb_endpoint: str
+        vectorstore: VectorStore
     ) -> None:
         """
         Only used if ENABLE_NV_INGEST_VDB_UPLOAD=False
@@ -386,26 +420,25 @@ class NVIngestIngestor(BaseIngestor):
 
         Arguments:
             - documents: List[Document] - List of langchain documents
-            - collection_name: str - VectorDB collection name
+            - vectorstore: VectorStore - Vectorstore of the target collection
         """
-        vs = get_vectorstore(DOCUMENT_EMBEDDER, collection_name, vdb_endpoint)
-        for i in range(0, len(documents), self._vdb_upload_bulk_size):
-            sub_documents = documents[i:i+self._vdb_upload_bulk_size]
-            # Add documents to vectorstore
-            vs.add_documents(sub_documents)
+        # Embed and add documents to vectorstore with several adaptively sized batches in flight
+        add_documents_pipelined(vectorstore, documents)
 
     @staticmethod
-    def _put_content_to_minio(
+    async def _put_content_to_minio(
         results: List[List[Dict[str, Union[str, dict]]]],
         collection_name: str,
     ) -> None:
         """
         Put nv-ingest image/table/chart content to minio
+        Uploads are performed off the event loop by a bounded pool of workers with retries
         """
         if not os.getenv("ENABLE_CITATIONS", "True") in ["True", "true"]:
             logger.info(f"Skipping minio insertion for collection: {collection_name}")
             return # Don't perform minio insertion if captioning is disabled
 
+        contents = list()
         for result in results:
             for result_element in result:
                 if result_element.get("document_type") in ["image", "structured"]:
@@ -423,19 +456,59 @@ class NVIngestIngestor(BaseIngestor):
                             page_number=page_number,
                             location=location
                         )
-                        # Put payload to minio
-                        MINIO_OPERATOR.put_payload(
-                            payload={"content": content},
-                            object_name=unique_thumbnail_id
-                        )
+                        contents.append((unique_thumbnail_id, content))
+
+        # Put contents to minio
+        failures = await asyncio.to_thread(MINIO_OPERATOR.put_contents, contents)
+        if failures:
+            logger.error(f"Failed to upload {len(failures)} of {len(contents)} objects to Minio for collection: {collection_name}")
 
     async def _nv_ingest_ingestion(
         self,
         filepaths: List[str],
         **kwargs
+    ) -> Dict[str, str]:
+        """
+        Split the filepaths into shards of NV_INGEST_FILES_PER_JOB files and ingest the shards
+        as concurrent nv-ingest jobs. Results of every shard are committed as soon as its job completes,
+        so a failing shard does not affect the documents of other shards.
+
+        Arguments:
+            - filepaths: List[str] - List of absolute filepaths
+            - kwargs: Any - Metadata about the file paths
+
+        Returns:
+            - failed_filepaths: Dict[str, str] - Filepaths which failed to ingest mapped to the error
+        """
+        shards = [
+            filepaths[i:i+NV_INGEST_FILES_PER_JOB]
+            for i in range(0, len(filepaths), NV_INGEST_FILES_PER_JOB)
+        ]
+        logger.info(f"Performing ingestion of {len(filepaths)} files in {len(shards)} nv-ingest jobs with parameters: {kwargs}")
+
+        outcomes = await asyncio.gather(
+            *[self._nv_ingest_shard_ingestion(filepaths=shard, **kwargs) for shard in shards],
+            return_exceptions=True
+        )
+
+        failed_filepaths = dict()
+        for shard, outcome in zip(shards, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error("NV-Ingest job for files %s failed due to error: %s", shard, outcome)
+                failed_filepaths.update({filepath: str(outcome) for filepath in shard})
+
+        if len(failed_filepaths) == len(filepaths):
+            # Surface the error as before when nothing could be ingested
+            raise next(outcome for outcome in outcomes if isinstance(outcome, Exception))
+        return failed_filepaths
+
+    async def _nv_ingest_shard_ingestion(
+        self,
+        filepaths: List[str],
+        **kwargs
     ) -> None:
         """
-        This methods performs following steps:
+        This methods performs following steps for a single shard of files:
         - Perform extraction and splitting using NV-ingest ingestor
         - Prepare langchain documents from the nv-ingest results
         - Embeds and add documents to Vectorstore collection
@@ -444,35 +517,67 @@ class NVIngestIngestor(BaseIngestor):
             - filepaths: List[str] - List of absolute filepaths
             - kwargs: Any - Metadata about the file paths
         """
-        nv_ingest_ingestor = get_nv_ingest_ingestor(
-            nv_ingest_client_instance=NV_INGEST_CLIENT_INSTANCE,
-            filepaths=filepaths,
-            **kwargs
-        )
-        logger.info(f"Performing ingestion with parameters: {kwargs}")
-        results = await asyncio.to_thread(nv_ingest_ingestor.ingest)
-        logger.debug("NV-ingest Job for collection_name: %s is complete!", kwargs.get("collection_name"))
+        # Only the nv-ingest job holds a slot, committing the results lets the next job start
+        async with NV_INGEST_JOB_SEMAPHORE:
+            # Client keeps per job state, so every concurrent job gets its own client
+            nv_ingest_ingestor = get_nv_ingest_ingestor(
+                nv_ingest_client_instance=get_nv_ingest_client(),
+                filepaths=filepaths,
+                **kwargs
+            )
+            results = await asyncio.to_thread(nv_ingest_ingestor.ingest)
+        logger.debug("NV-ingest Job for files %s in collection_name: %s is complete!", filepaths, kwargs.get("collection_name"))
 
         if not results:
             error_message = "NV-Ingest ingestion failed with no results. Please check the ingestor-server microservice logs for more details."
             logger.error(error_message)
             raise Exception(error_message)
 
-        self._put_content_to_minio(
-            results=results,
-            collection_name=kwargs.get("collection_name")
-        )
+        await self._commit_nv_ingest_results(results=results, **kwargs)
+
+    async def _commit_nv_ingest_results(
+        self,
+        results: List[List[Dict[str, Union[str, dict]]]],
+        **kwargs
+    ) -> None:
+        """
+        Write nv-ingest results to minio and vectorstore one document at a time.
+        Each document's results are released from the results list once its content is uploaded
+        and its chunks are converted, so the base64 content of the whole batch is never duplicated.
+        Text chunks are buffered and added to the vectorstore in bulks of _vdb_upload_bulk_size.
 
+        Arguments:
+            - results: List[List[Dict[str, Union[str, dict]]]] - Results obtained from nv-ingest, emptied in place
+            - kwargs: Any - Metadata about the file paths
+        """
+        collection_name = kwargs.get("collection_name")
+        vs = None
         if not ENABLE_NV_INGEST_VDB_UPLOAD:
             logger.debug("Performing embedding and vector DB upload")
+            vs = get_vectorstore(DOCUMENT_EMBEDDER, collection_name, kwargs.get("vdb_endpoint"))
 
-            # Prepare the documents for nv-ingest results
-            documents = self._prepare_langchain_documents(results)
+        pending_documents = list()
+        for index in range(len(results)):
+            document_results = [results[index]]
+            results[index] = None
+
+            if vs is None:
+                await self._put_content_to_minio(results=document_results, collection_name=collection_name)
+                continue
 
-            # Add all documents to VectorStore
-            self._add_documents_to_vectorstore(
-                documents=documents,
-                collection_name=kwargs.get("collection_name"),
-                vdb_endpoint=kwargs.get("vdb_endpoint")
+            # Prepare the documents for nv-ingest results
+            pending_documents.extend(self._prepare_langchain_documents(document_results))
+
+            # Add full bulks to VectorStore while thumbnails are uploaded to minio.
+            # The upload coroutine is only created here, so it is never left unawaited if preparing fails.
+            num_ready = len(pending_documents) - len(pending_documents) % self._vdb_upload_bulk_size
+            ready_documents, pending_documents = pending_documents[:num_ready], pending_documents[num_ready:]
+            await asyncio.gather(
+                self._put_content_to_minio(results=document_results, collection_name=collection_name),
+                asyncio.to_thread(self._add_documents_to_vectorstore, documents=ready_documents, vectorstore=vs)
             )
-            logger.debug("Vector DB upload complete to: %s in collection %s", kwargs.get("vdb_endpoint"), kwargs.get("collection_name"))
\ No newline at end of file
+            del document_results
+
+        if vs is not None:
+            await asyncio.to_thread(self._add_documents_to_vectorstore, documents=pending_documents, vectorstore=vs)
+            logger.debug("Vector DB upload complete to: %s in collection %s", kwargs.get("vdb_endpoint"), collection_name)
@@ -36,6 +36,7 @@ from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 from nv_ingest_client.util.file_processing.extract import EXTENSION_TO_DOCUMENT_TYPE
 
 from src.chains import UnstructuredRAG
+from src.utils import UPLOAD_FOLDER
 from .main import NVIngestIngestor
 
 logging.basicConfig(level=os.environ.get('LOGLEVEL', 'INFO').upper())
@@ -147,6 +148,18 @@ class DocumentListResponse(BaseModel):
     message: str = Field("", description="Message indicating the status of the request.")
     total_documents: int = Field(0, description="Total number of documents uploaded.")
     documents: List[UploadedDocument] = Field([], description="List of uploaded documents.")
+    failed_documents: List[str] = Field([], description="List of documents which failed to be processed.")
+
+class DeletedDocument(UploadedDocument):
+    """Model representing an individual deleted document."""
+    chunks_deleted: int = Field(0, description="Number of chunks deleted from the vector database for the document.")
+
+class DocumentDeleteResponse(BaseModel):
+    """Response model for deleting documents."""
+    message: str = Field("", description="Message indicating the status of the request.")
+    total_documents: int = Field(0, description="Total number of documents deleted.")
+    documents: List[DeletedDocument] = Field([], description="List of deleted documents.")
+    failed_documents: List[str] = Field([], description="List of documents which could not be deleted.")
 
 class UploadedCollection(BaseModel):
     """Model representing an individual uploaded document."""
@@ -295,7 +308,7 @@ async def upload_document(documents: List[UploadFile] = File(...),
     temp_dirs = []
 
     try:
-        base_upload_folder = Path("/tmp-data/uploaded_files")
+        base_upload_folder = Path(UPLOAD_FOLDER)
         base_upload_folder.mkdir(parents=True, exist_ok=True)
 
         for file in documents:
@@ -339,9 +352,6 @@ async def upload_document(documents: List[UploadFile] = File(...),
             with open(file_path, "wb") as f:
                 shutil.copyfileobj(file.file, f)
 
-            if not ENABLE_NV_INGEST:
-                UNSTRUCTURED_RAG_CHAIN.ingest_docs(str(file_path), upload_file, request.collection_name, request.vdb_endpoint)
-
         if ENABLE_NV_INGEST:
             response_dict = await NV_INGEST_INGESTOR.ingest_docs(
                 filepaths=all_file_paths,
@@ -350,7 +360,21 @@ async def upload_document(documents: List[UploadFile] = File(...),
             )
             return DocumentListResponse(**response_dict)
 
-        return JSONResponse(content="Documents uploaded successfully!", status_code=200)
+        # Parse and split all files in parallel worker processes
+        failed_file_paths = await asyncio.to_thread(
+            UNSTRUCTURED_RAG_CHAIN.ingest_docs_batch, all_file_paths, request.collection_name, request.vdb_endpoint
+        )
+        # Files which failed are reported alongside the ingested ones, like the nv-ingest path does
+        ingested_file_paths = [file_path for file_path in all_file_paths if file_path not in failed_file_paths]
+        message = "Document upload job successfully completed."
+        if failed_file_paths:
+            message = f"Document upload job completed. {len(failed_file_paths)} of {len(all_file_paths)} documents failed to ingest, check ingestor-server logs for details."
+        return DocumentListResponse(
+            message=message,
+            total_documents=len(ingested_file_paths),
+            documents=[UploadedDocument(document_name=os.path.basename(file_path)) for file_path in ingested_file_paths],
+            failed_documents=[os.path.basename(file_path) for file_path in failed_file_paths],
+        )
 
     except asyncio.CancelledError as e:
         logger.warning(f"Request cancelled while uploading document {e}")
@@ -477,7 +501,7 @@ async def get_documents(
 @app.delete(
     "/documents",
     tags=["Ingestion APIs"],
-    response_model=DocumentListResponse,
+    response_model=DocumentDeleteResponse,
     responses={
         499: {
             "description": "Client Closed Request",
@@ -501,12 +525,12 @@ async def get_documents(
         }
     },
 )
-async def delete_documents(_: Request, document_names: List[str] = [], collection_name: str = os.getenv("COLLECTION_NAME"), vdb_endpoint: str = Query(default=os.getenv("APP_VECTORSTORE_URL"), include_in_schema=False)) -> DocumentListResponse:
+async def delete_documents(_: Request, document_names: List[str] = [], collection_name: str = os.getenv("COLLECTION_NAME"), vdb_endpoint: str = Query(default=os.getenv("APP_VECTORSTORE_URL"), include_in_schema=False)) -> DocumentDeleteResponse:
     """Delete a document from vectorstore."""
     try:
         if hasattr(NV_INGEST_INGESTOR, "delete_documents") and callable(NV_INGEST_INGESTOR.delete_documents):
             response = NV_INGEST_INGESTOR.delete_documents(document_names=document_names, document_ids=[], collection_name=collection_name, vdb_endpoint=vdb_endpoint)
-            return DocumentListResponse(**response)
+            return DocumentDeleteResponse(**response)
 
         raise NotImplementedError("Example class has not implemented the delete_document method.")
 
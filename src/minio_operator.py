@@ -15,15 +15,41 @@
 """Minio operator Module to store metadata"""
 
 import os
+import base64
 import json
 import logging
-from typing import Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Tuple
 from io import BytesIO
 
 from minio import Minio
+from minio.deleteobjects import DeleteObject
 
 logger = logging.getLogger(__name__)
 
+# Storage format of multimodal content, "binary" stores raw image bytes, "json" stores legacy {"content": "<base64>"} objects
+THUMBNAIL_STORAGE_FORMAT = os.getenv("MINIO_THUMBNAIL_FORMAT", "binary").lower()
+
+# Magic bytes used to set the content type of binary objects
+_IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def _detect_content_type(data: bytes) -> str:
+    """Detect image content type from the leading bytes of the data"""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
 class MinioOperator:
     """Minio operator Class to store metadata using Minio-client"""
 
@@ -66,6 +92,82 @@ class MinioOperator:
             content_type="application/json"
         )
 
+    def put_content(
+        self,
+        content: str,
+        object_name: str
+    ):
+        """Put base64 encoded content to S3 storage using minio client
+
+        With MINIO_THUMBNAIL_FORMAT=binary the content is stored as raw bytes with its image content type,
+        otherwise it is stored as legacy JSON payload {"content": "<base64>"}.
+        """
+        if THUMBNAIL_STORAGE_FORMAT != "binary":
+            self.put_payload(payload={"content": content}, object_name=object_name)
+            return
+
+        data = base64.b64decode(content)
+        self.client.put_object(
+            self.default_bucket_name,
+            object_name,
+            BytesIO(data),
+            len(data),
+            content_type=_detect_content_type(data),
+            metadata={"content-encoding": "binary", "original-encoding": "base64"}
+        )
+
+    @staticmethod
+    def _put_with_retry(
+        put_fn: Callable[[], None],
+        object_name: str,
+        max_retries: int,
+        backoff_seconds: float
+    ) -> None:
+        """Run an upload to S3 storage, retrying with exponential backoff on failure"""
+        for attempt in range(max_retries + 1):
+            try:
+                put_fn()
+                return
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = backoff_seconds * (2 ** attempt)
+                logger.warning(f"Retry {attempt + 1}/{max_retries} for Minio upload of {object_name} in {delay}s: {e}")
+                time.sleep(delay)
+
+    def put_contents(
+        self,
+        contents: List[Tuple[str, str]],
+        max_workers: int = int(os.getenv("MINIO_UPLOAD_WORKERS", 8)),
+        max_retries: int = int(os.getenv("MINIO_UPLOAD_MAX_RETRIES", 3)),
+        backoff_seconds: float = 0.5
+    ) -> List[Dict[str, str]]:
+        """Put multiple base64 encoded contents to S3 storage concurrently using a bounded pool of workers
+
+        Arguments:
+            - contents: List[Tuple[str, str]] - List of (object_name, base64 content) pairs
+
+        Returns:
+            - failures: List[Dict[str, str]] - Object name and error message of every content which failed to upload
+        """
+        def _upload(object_name_content: Tuple[str, str]) -> Dict[str, str]:
+            object_name, content = object_name_content
+            try:
+                self._put_with_retry(
+                    lambda: self.put_content(content=content, object_name=object_name),
+                    object_name, max_retries, backoff_seconds
+                )
+            except Exception as e:
+                logger.error(f"Failed to upload object {object_name} to Minio: {e}")
+                return {"object_name": object_name, "error": str(e)}
+            return None
+
+        if not contents:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(contents)))) as executor:
+            return [failure for failure in executor.map(_upload, contents) if failure]
+
     def get_payload(
         self,
         object_name: str
@@ -82,7 +184,36 @@ class MinioOperator:
         except Exception as e:
             logger.warning(f"Error while getting object from Minio: {e}. Citations or image captions may not be set to true.")
             return {}
-    
+
+    def get_content(
+        self,
+        object_name: str
+    ) -> str:
+        """Get base64 encoded content from S3 storage using minio client
+
+        Binary objects are read as raw bytes and base64 encoded, legacy JSON objects are parsed transparently.
+        Returns an empty string if the object can not be read.
+        """
+        response = None
+        try:
+            response = self.client.get_object(self.default_bucket_name, object_name)
+            content_type = response.headers.get("Content-Type", "")
+            data = bytearray()
+            for chunk in response.stream(64 * 1024):
+                data.extend(chunk)
+
+            if content_type.startswith("application/json"):
+                # Legacy object stored as {"content": "<base64>"}
+                return json.loads(data.decode("utf-8")).get("content", "")
+            return base64.b64encode(data).decode("ascii")
+        except Exception as e:
+            logger.warning(f"Error while getting object from Minio: {e}. Citations or image captions may not be set to true.")
+            return ""
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
     def list_payloads(
         self,
         prefix: str = ""
@@ -95,8 +226,48 @@ class MinioOperator:
 
     def delete_payloads(
         self,
-        object_names: List[str]
-    ) -> None:
-        """Delete payloads from S3 storage using minio client"""
-        for object_name in object_names:
-            self.client.remove_object(self.default_bucket_name, object_name)
+        object_names: Iterable[str]
+    ) -> List[Dict[str, str]]:
+        """Delete payloads from S3 storage using minio multi-object delete API
+
+        Object names are consumed lazily and sent in batches of up to 1000 objects per request,
+        so a generator (e.g. a prefix listing) is deleted as it is produced.
+
+        Returns:
+            - failures: List[Dict[str, str]] - Object name and error message of every object which failed to delete
+        """
+        delete_objects = (DeleteObject(object_name) for object_name in object_names)
+        failures = list()
+        # remove_objects is lazy, errors are only reported (and deletion performed) while iterating
+        for error in self.client.remove_objects(self.default_bucket_name, delete_objects):
+            logger.warning(f"Failed to delete object {error.name} from Minio: {error.message}")
+            failures.append({"object_name": error.name, "error": error.message})
+        return failures
+
+    def delete_payloads_with_prefixes(
+        self,
+        prefixes: List[str],
+        max_workers: int = int(os.getenv("MINIO_DELETE_WORKERS", 4))
+    ) -> List[Dict[str, str]]:
+        """Delete all payloads under the given prefixes, streaming listing into deletion
+
+        Each prefix is listed and deleted concurrently with the others using a bounded pool of workers.
+
+        Returns:
+            - failures: List[Dict[str, str]] - Object name and error message of every object which failed to delete
+        """
+        def _delete_prefix(prefix: str) -> List[Dict[str, str]]:
+            object_names = (
+                obj.object_name
+                for obj in self.client.list_objects(self.default_bucket_name, prefix=prefix, recursive=True)
+            )
+            return self.delete_payloads(object_names)
+
+        if not prefixes:
+            return []
+
+        failures = list()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prefixes)))) as executor:
+            for prefix_failures in executor.map(_delete_prefix, prefixes):
+                failures.extend(prefix_failures)
+        return failures
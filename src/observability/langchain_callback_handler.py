@@ -16,6 +16,7 @@
 import json
 import logging
 import os
+import threading
 import time
 import traceback
 from collections.abc import Sequence
@@ -29,6 +30,7 @@ from langchain_core.messages import BaseMessage, AIMessageChunk
 from langchain_core.prompt_values import ChatPromptValue
 from langchain_core.outputs import LLMResult
 from opentelemetry import context as context_api
+from opentelemetry.context import _RUNTIME_CONTEXT
 from opentelemetry.context.context import Context
 from opentelemetry.instrumentation.utils import _SUPPRESS_INSTRUMENTATION_KEY
 from opentelemetry.semconv_ai import (
@@ -37,11 +39,16 @@ from opentelemetry.semconv_ai import (
     SpanAttributes,
     TraceloopSpanKindValues,
 )
-from opentelemetry.trace import SpanKind, Tracer, set_span_in_context
+from opentelemetry.trace import SpanKind, Status, StatusCode, Tracer, set_span_in_context
 from opentelemetry.trace.span import Span
 from pydantic import BaseModel
 from .otel_metrics import OtelMetrics
 
+logger = logging.getLogger(__name__)
+
+# Keys of the run metadata used as attributes of the token metrics
+METRIC_ATTRIBUTES = ("endpoint", "collection", "model")
+
 
 class Config:
     exception_logger = None
@@ -108,6 +115,11 @@ class SpanHolder:
     entity_path: str
     start_time: float = field(default_factory=time.time)
     request_model: Optional[str] = None
+    token_count: int = 0
+    first_token_time: Optional[float] = None
+    last_token_time: Optional[float] = None
+    # Endpoint, collection and model of the request, from the run metadata
+    metric_attributes: Dict[str, str] = field(default_factory=dict)
 
 
 def _message_type_to_role(message_type: str) -> str:
@@ -126,6 +138,35 @@ def _set_span_attribute(span, name, value):
         span.set_attribute(name, value)
 
 
+def _end_if_open(span: Span) -> None:
+    # Non recording spans of unsampled traces have no end_time
+    if getattr(span, "end_time", None) is None:
+        span.end()
+
+
+def _detach_context(token: Any) -> None:
+    """Detach a context attached by a span, silently failing if it was attached in another context"""
+    try:
+        _RUNTIME_CONTEXT.detach(token)
+    except Exception:
+        pass
+
+
+def _set_token_stats(span: Span, span_holder: SpanHolder) -> None:
+    """Set the streamed token count and timings aggregated by on_llm_new_token"""
+    if not span_holder.token_count:
+        return
+    span.set_attribute("llm.streaming.token_count", span_holder.token_count)
+    span.set_attribute(
+        "llm.streaming.time_to_first_token",
+        span_holder.first_token_time - span_holder.start_time,
+    )
+    span.set_attribute(
+        "llm.streaming.generation_duration",
+        span_holder.last_token_time - span_holder.first_token_time,
+    )
+
+
 def _set_request_params(span, kwargs, span_holder: SpanHolder):
     for model_tag in ("model", "model_id", "model_name"):
         if (model := kwargs.get(model_tag)) is not None:
@@ -333,13 +374,24 @@ def _set_chat_response(span: Span, response: LLMResult) -> None:
 
 
 class LangchainCallbackHandler(BaseCallbackHandler):
-    def __init__(self, tracer: Tracer, metrics: OtelMetrics) -> None:
+    def __init__(
+        self,
+        tracer: Tracer,
+        metrics: OtelMetrics,
+        token_events: bool = False,
+        max_active_spans: int = 10000,
+    ) -> None:
         super().__init__()
         self.tracer = tracer
         self.metrics = metrics
+        # Add a span event per streamed token instead of only aggregating them
+        self.token_events = token_events
+        self.max_active_spans = max_active_spans
         self.total_input_words = 0
         self.total_output_words = 0
+        # Spans of unfinished runs, removed once the run ends
         self.spans: dict[UUID, SpanHolder] = {}
+        self.spans_lock = threading.Lock()
         self.run_inline = True
 
     @staticmethod
@@ -365,12 +417,43 @@ class LangchainCallbackHandler(BaseCallbackHandler):
         return self.spans[run_id].span
 
     def _end_span(self, span: Span, run_id: UUID) -> None:
-        for child_id in self.spans[run_id].children:
-            child_span = self.spans[child_id].span
-            if child_span.end_time is None:  # avoid warning on ended spans
-                child_span.end()
+        with self.spans_lock:
+            span_holder = self.spans.pop(run_id, None)
+            children = [
+                self.spans.pop(child_id)
+                for child_id in (span_holder.children if span_holder else [])
+                if child_id in self.spans
+            ]
+        for child_holder in children:
+            _end_if_open(child_holder.span)  # avoid warning on ended spans
+        if span_holder is not None:
+            _set_token_stats(span, span_holder)
         span.end()
 
+    def _evict_oldest_spans(self) -> None:
+        """End the oldest unfinished spans once max_active_spans is reached, e.g. of abandoned streams"""
+        while len(self.spans) >= self.max_active_spans:
+            run_id = next(iter(self.spans))
+            span_holder = self.spans.pop(run_id)
+            logger.debug("Evicting unfinished span of run %s, %s spans are active", run_id, len(self.spans) + 1)
+            span_holder.span.set_attribute("langchain.span.evicted", True)
+            _end_if_open(span_holder.span)
+            # The run will not end, so the context it attached is never detached otherwise
+            _detach_context(span_holder.token)
+            if self.metrics is not None:
+                self.metrics.record_span_eviction()
+
+    def _handle_error(self, error: BaseException, run_id: UUID) -> None:
+        if context_api.get_value(_SUPPRESS_INSTRUMENTATION_KEY):
+            return
+        span_holder = self.spans.get(run_id)
+        if span_holder is None:
+            return
+        span = span_holder.span
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.record_exception(error)
+        self._end_span(span, run_id)
+
     def _create_span(
         self,
         run_id: UUID,
@@ -408,12 +491,18 @@ class LangchainCallbackHandler(BaseCallbackHandler):
             context_api.set_value(SUPPRESS_LANGUAGE_MODEL_INSTRUMENTATION_KEY, True)
         )
 
-        self.spans[run_id] = SpanHolder(
-            span, token, None, [], workflow_name, entity_name, entity_path
-        )
+        metric_attributes = {
+            name: metadata[name] for name in METRIC_ATTRIBUTES if metadata and name in metadata
+        }
+        with self.spans_lock:
+            self._evict_oldest_spans()
+            self.spans[run_id] = SpanHolder(
+                span, token, None, [], workflow_name, entity_name, entity_path,
+                metric_attributes=metric_attributes,
+            )
 
-        if parent_run_id is not None and parent_run_id in self.spans:
-            self.spans[parent_run_id].children.append(run_id)
+            if parent_run_id is not None and parent_run_id in self.spans:
+                self.spans[parent_run_id].children.append(run_id)
 
         return span
 
@@ -511,7 +600,7 @@ class LangchainCallbackHandler(BaseCallbackHandler):
             entity_path,
             metadata,
         )
-        if should_send_prompts():
+        if should_send_prompts() and span.is_recording():
             span.set_attribute(
                 SpanAttributes.TRACELOOP_ENTITY_INPUT,
                 json.dumps(
@@ -557,14 +646,16 @@ class LangchainCallbackHandler(BaseCallbackHandler):
                     self.metrics.update_llm_tokens(
                         input_t=self.total_input_words,
                         output_t=self.total_output_words,
+                        attributes=span_holder.metric_attributes,
                     )
-            span.set_attribute(
-                SpanAttributes.TRACELOOP_ENTITY_OUTPUT,
-                json.dumps(
-                    {"outputs": outputs, "kwargs": kwargs},
-                    cls=CallbackFilteredJSONEncoder,
-                ),
-            )
+            if span.is_recording():
+                span.set_attribute(
+                    SpanAttributes.TRACELOOP_ENTITY_OUTPUT,
+                    json.dumps(
+                        {"outputs": outputs, "kwargs": kwargs},
+                        cls=CallbackFilteredJSONEncoder,
+                    ),
+                )
 
         self._end_span(span, run_id)
         if parent_run_id is None:
@@ -601,14 +692,22 @@ class LangchainCallbackHandler(BaseCallbackHandler):
         span = self._create_llm_span(
             run_id, parent_run_id, name, LLMRequestTypeValues.CHAT, metadata=metadata
         )
-        _set_chat_request(span, serialized, messages, kwargs, self.spans[run_id])
+        if span.is_recording():
+            _set_chat_request(span, serialized, messages, kwargs, self.spans[run_id])
 
     @dont_throw
     def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
         """Run on new LLM token. Only available when streaming is enabled."""
-        # TODO: add error handling
-        span = self.spans[kwargs.get("run_id")].span
-        span.add_event("on_llm_new_token")
+        span_holder = self.spans.get(kwargs.get("run_id"))
+        if span_holder is None or not span_holder.span.is_recording():
+            return
+        now = time.time()
+        if span_holder.first_token_time is None:
+            span_holder.first_token_time = now
+        span_holder.last_token_time = now
+        span_holder.token_count += 1
+        if self.token_events:
+            span_holder.span.add_event("on_llm_new_token")
 
     @dont_throw
     def on_llm_start(
@@ -685,9 +784,25 @@ class LangchainCallbackHandler(BaseCallbackHandler):
                 span, SpanAttributes.LLM_USAGE_TOTAL_TOKENS, total_tokens
             )
 
-        _set_chat_response(span, response)
+        if span.is_recording():
+            _set_chat_response(span, response)
         self._end_span(span, run_id)
 
+    @dont_throw
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Run when LLM errors."""
+        self._handle_error(error, run_id)
+
+    @dont_throw
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Run when chain errors."""
+        self._handle_error(error, run_id)
+
+    @dont_throw
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Run when tool errors."""
+        self._handle_error(error, run_id)
+
     @dont_throw
     def on_tool_start(
         self,
@@ -762,7 +877,7 @@ class LangchainCallbackHandler(BaseCallbackHandler):
     def get_parent_span(self, parent_run_id: Optional[str] = None):
         if parent_run_id is None:
             return None
-        return self.spans[parent_run_id]
+        return self.spans.get(parent_run_id)
 
     def get_workflow_name(self, parent_run_id: str):
         parent_span = self.get_parent_span(parent_run_id)
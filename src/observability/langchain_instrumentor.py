@@ -47,7 +47,12 @@ class LangchainInstrumentor(BaseInstrumentor):
         tracer_provider = kwargs.get("tracer_provider")
         tracer = get_tracer(__name__, __version__, tracer_provider)
         metrics = kwargs.get("metrics")
-        langchainCallbackHandler = LangchainCallbackHandler(tracer, metrics)
+        langchainCallbackHandler = LangchainCallbackHandler(
+            tracer,
+            metrics,
+            token_events=kwargs.get("token_events", False),
+            max_active_spans=kwargs.get("max_active_spans", 10000),
+        )
         wrap_function_wrapper(
             module="langchain_core.callbacks",
             name="BaseCallbackManager.__init__",
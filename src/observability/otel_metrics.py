@@ -16,7 +16,10 @@
 """Opentelemetery Metrics"""
 
 import logging
+from typing import Callable, Dict, Optional
+
 from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
 
 
 class OtelMetrics:
@@ -48,6 +51,42 @@ class OtelMetrics:
             "token_usage_distribution",
             description="Token usage distribution per request",
         )
+        self.input_token_counter = self.meter.create_counter(
+            "input_tokens_total", description="Total input tokens processed"
+        )
+        self.output_token_counter = self.meter.create_counter(
+            "output_tokens_total", description="Total output tokens generated"
+        )
+        self.input_token_histogram = self.meter.create_histogram(
+            "input_tokens_per_request", description="Input tokens processed per request"
+        )
+        self.output_token_histogram = self.meter.create_histogram(
+            "output_tokens_per_request", description="Output tokens generated per request"
+        )
+        self.stage_duration_histogram = self.meter.create_histogram(
+            "rag_stage_duration_seconds", unit="s",
+            description="Duration of RAG pipeline stages (query_rewrite, embedding, vector_search, rerank, reflection, citations)",
+        )
+        self.ttft_histogram = self.meter.create_histogram(
+            "rag_time_to_first_token_seconds", unit="s",
+            description="Time from request arrival to the first generated token",
+        )
+        self.generation_duration_histogram = self.meter.create_histogram(
+            "rag_generation_duration_seconds", unit="s",
+            description="Time from the first to the last generated token",
+        )
+        self.request_duration_histogram = self.meter.create_histogram(
+            "rag_request_duration_seconds", unit="s",
+            description="End-to-end request latency",
+        )
+        self.degradation_counter = self.meter.create_counter(
+            "rag_degradations_total",
+            description="Requests answered without an auxiliary model (reranker, query_rewriter, reflection)",
+        )
+        self.evicted_span_counter = self.meter.create_counter(
+            "rag_tracing_evicted_spans_total",
+            description="Unfinished Langchain spans ended because APP_TRACING_MAXACTIVESPANS was reached",
+        )
         logging.info("OpenTelemetry Metrics Initialized")
 
     def update_api_requests(self, method: str = None, endpoint: str = None):
@@ -56,14 +95,19 @@ class OtelMetrics:
             self.api_request_counter.add(1, {"method": method, "endpoint": endpoint})
             logging.info(f"API Request Tracked: {method} {endpoint}")
 
-    def update_llm_tokens(self, input_t: int = None, output_t: int = None):
-        """Updates the token-related metrics."""
+    def update_llm_tokens(self, input_t: int = None, output_t: int = None, attributes: Optional[Dict[str, str]] = None):
+        """Updates the token-related metrics.
+        Attributes are expected to hold endpoint, collection and model of the request."""
         if input_t is not None and output_t is not None:
             total_t = input_t + output_t
-            self.input_token_gauge.set(input_t)
-            self.output_token_gauge.set(output_t)
-            self.total_token_gauge.set(total_t)
-            self.token_usage_histogram.record(total_t)
+            self.input_token_gauge.set(input_t, attributes)
+            self.output_token_gauge.set(output_t, attributes)
+            self.total_token_gauge.set(total_t, attributes)
+            self.token_usage_histogram.record(total_t, attributes)
+            self.input_token_counter.add(input_t, attributes)
+            self.output_token_counter.add(output_t, attributes)
+            self.input_token_histogram.record(input_t, attributes)
+            self.output_token_histogram.record(output_t, attributes)
             logging.info(
                 f"Token Usage - Input: {input_t}, Output: {output_t}, Total: {total_t}"
             )
@@ -73,3 +117,45 @@ class OtelMetrics:
         if avg_words_per_chunk is not None:
             self.avg_words_per_chunk_gauge.set(avg_words_per_chunk)
             logging.info(f"Avg words per chunk: {avg_words_per_chunk}")
+
+    def record_stage_duration(self, stage: str, duration: float, attributes: Dict[str, str]):
+        """Records the duration in seconds of a RAG pipeline stage.
+        Attributes are expected to hold endpoint, collection and model of the request."""
+        self.stage_duration_histogram.record(duration, {"stage": stage, **attributes})
+
+    def record_span_eviction(self):
+        """Counts an unfinished Langchain span ended to stay within the maximum number of active spans."""
+        self.evicted_span_counter.add(1)
+
+    def record_generation(self, ttft: float, generation_duration: float, attributes: Dict[str, str]):
+        """Records time to first token and generation duration in seconds of a streamed response."""
+        self.ttft_histogram.record(ttft, attributes)
+        self.generation_duration_histogram.record(generation_duration, attributes)
+
+    def record_request_duration(self, duration: float, attributes: Dict[str, str]):
+        """Records the end-to-end latency in seconds of a request."""
+        self.request_duration_histogram.record(duration, attributes)
+
+    def record_degradation(self, dependency: str, reason: str, attributes: Dict[str, str]):
+        """Records a request skipping a dependency, because of an open circuit breaker or a failed call."""
+        self.degradation_counter.add(1, {"dependency": dependency, "reason": reason, **attributes})
+
+    def observe_llm_client_cache(self, cache_info: Callable):
+        """Reports the size, hits and misses of the shared llm client cache, read from cache_info() on every export."""
+
+        def observe_size(options: CallbackOptions):
+            yield Observation(cache_info().currsize)
+
+        def observe_lookups(options: CallbackOptions):
+            info = cache_info()
+            yield Observation(info.hits, {"result": "hit"})
+            yield Observation(info.misses, {"result": "miss"})
+
+        self.meter.create_observable_gauge(
+            "rag_llm_clients", callbacks=[observe_size],
+            description="LLM clients kept in the shared client cache",
+        )
+        self.meter.create_observable_counter(
+            "rag_llm_client_cache_lookups", callbacks=[observe_lookups],
+            description="Lookups of the shared llm client cache by result",
+        )
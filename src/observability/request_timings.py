@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Request scoped timing breakdown of RAG pipeline stages"""
+
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+_REQUEST_TIMINGS: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Accumulates the duration of every stage of a single request."""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, duration: float):
+        """Adds the duration in seconds to a stage, stages run multiple times are summed up."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def elapsed(self) -> float:
+        """Seconds elapsed since the start of the request."""
+        return time.perf_counter() - self.start_time
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        """Stage durations in milliseconds."""
+        return {stage: round(duration * 1000, 3) for stage, duration in self.stages.items()}
+
+    def server_timing_header(self) -> str:
+        """Stage durations formatted as Server-Timing header value."""
+        return ", ".join(f"{stage};dur={duration}" for stage, duration in self.as_milliseconds().items())
+
+
+def start_request_timings() -> RequestTimings:
+    """Starts collecting stage timings for the current request context."""
+    timings = RequestTimings()
+    _REQUEST_TIMINGS.set(timings)
+    return timings
+
+
+def record_request_timing(stage: str, duration: float):
+    """Adds a stage duration to the timings of the current request, if collected."""
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.add(stage, duration)
+
+
+class TimedEmbeddings(Embeddings):
+    """Embedding model wrapper reporting the duration of every embedding call.
+    Created per request, elapsed holds the total embedding time of the request."""
+
+    def __init__(self, embeddings: Embeddings, on_duration: Callable[[float], None]):
+        self.embeddings = embeddings
+        self.on_duration = on_duration
+        self.elapsed = 0.0
+
+    def _timed(self, embed_fn, *args):
+        start_time = time.perf_counter()
+        try:
+            return embed_fn(*args)
+        finally:
+            duration = time.perf_counter() - start_time
+            self.elapsed += duration
+            self.on_duration(duration)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._timed(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._timed(self.embeddings.embed_query, text)
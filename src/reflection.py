@@ -12,19 +12,43 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextvars
 import logging
 import os
-from typing import List, Tuple, Dict, Any
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple, Dict, Any
 
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain_core.prompts.chat import ChatPromptTemplate
 from langchain_core.runnables import RunnableAssign
 
-from .utils import get_llm, get_prompts, get_env_variable
+from .utils import get_llm, get_prompts, get_env_variable, normalize_relevance_score
+from .request_deadline import remaining_request_time, request_time_fits
 
 logger = logging.getLogger(__name__)
 prompts = get_prompts()
 
+# "iterative" rewrites the query and retrieves again one loop at a time, "parallel" generates
+# several rewrites in a single LLM call and retrieves and scores all of them concurrently
+REFLECTION_STRATEGY = os.getenv("REFLECTION_STRATEGY", "iterative").lower()
+# Number of rewritten queries generated by the parallel strategy, scored next to the original query
+REFLECTION_PARALLEL_CANDIDATES = int(os.getenv("REFLECTION_PARALLEL_CANDIDATES", 3))
+_REFLECTION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REFLECTION_PARALLEL_WORKERS", 16)), thread_name_prefix="reflection"
+)
+# Number of completed sentences verified together by the streaming groundedness check
+REFLECTION_GROUNDEDNESS_BATCH_SIZE = int(os.getenv("REFLECTION_GROUNDEDNESS_BATCH_SIZE", 3))
+# Groundedness checks run on their own threads, so they never wait behind context reflection
+_GROUNDEDNESS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REFLECTION_GROUNDEDNESS_WORKERS", 4)), thread_name_prefix="groundedness"
+)
+_CANDIDATE_PREFIX = re.compile(r"^\s*(?:\d+[.)]|[-*])\s*")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+_SENTENCE_SCORE = re.compile(r"^\s*\[?(\d+)\]?\s*[:.)-]?\s*([012])\b", re.MULTILINE)
+
 def _retry_score_generation(chain, inputs: Dict[str, Any], max_retries: int = 3, config: Dict[str, Any] = {}) -> int:
     """Helper method to retry score generation with error handling.
     
@@ -45,12 +69,57 @@ def _retry_score_generation(chain, inputs: Dict[str, Any], max_retries: int = 3,
                     return score
         except Exception as e:
             logger.warning(f"Retry {retry + 1}/{max_retries} failed: {str(e)}")
-            if retry == max_retries - 1:
+            if retry == max_retries - 1 or not request_time_fits(0):
                 logger.error(f"All retries failed for score generation")
                 return 0
             continue
     return 0
 
+class RelevanceGate:
+    """Decides context relevance from the normalized top reranker score where it is confident enough.
+    Scores at or above accept_score are relevant, scores below reject_score are not, and only the band
+    in between is scored by the reflection LLM."""
+
+    def __init__(self, enabled: bool, accept_score: float, reject_score: float):
+        self.enabled = enabled
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self.band_counts = {"accept": 0, "reject": 0, "llm": 0}
+        self._lock = threading.Lock()
+
+    def band(self, documents: List[Any]) -> str:
+        """Return accept, reject or llm for the reranked documents and log the hit rate of each band."""
+        top_score = self._top_score(documents) if self.enabled else None
+        if top_score is None:
+            band = "llm"
+        elif top_score >= self.accept_score:
+            band = "accept"
+        elif top_score < self.reject_score:
+            band = "reject"
+        else:
+            band = "llm"
+
+        with self._lock:
+            self.band_counts[band] += 1
+            total = sum(self.band_counts.values())
+            hit_rates = ", ".join(f"{name} {count / total:.1%}" for name, count in self.band_counts.items())
+        logger.info(f"Relevance gate band: {band}, top reranker score: {top_score}, hit rates of {total} checks: {hit_rates}")
+        return band
+
+    @staticmethod
+    def _top_score(documents: List[Any]) -> Optional[float]:
+        scores = [d.metadata["relevance_score"] for d in documents if "relevance_score" in d.metadata]
+        if not scores:
+            return None
+        return normalize_relevance_score(max(scores))
+
+
+RELEVANCE_GATE = RelevanceGate(
+    enabled=os.getenv("ENABLE_REFLECTION_SCORE_GATING", "True").lower() == "true",
+    accept_score=float(os.getenv("REFLECTION_GATING_ACCEPT_SCORE", 0.7)),
+    reject_score=float(os.getenv("REFLECTION_GATING_REJECT_SCORE", 0.3)),
+)
+
 class ReflectionCounter:
     """Tracks the number of reflection iterations across query rewrites and response regeneration."""
     def __init__(self, max_loops: int):
@@ -68,12 +137,115 @@ class ReflectionCounter:
     def remaining(self) -> int:
         return max(0, self.max_loops - self.current_count)
 
+def _submit(function, *args, executor: ThreadPoolExecutor = _REFLECTION_EXECUTOR):
+    """Run a function on the reflection executor, or the given one, in a copy of the current context"""
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+def _retrieve_and_score(query: str, retriever, ranker, enable_reranker: bool, relevance_chain) -> Tuple[List[Any], int]:
+    """Retrieve, and rerank if enabled, documents for a query and score their relevance to the query.
+    The reflection LLM is only asked for the score if the reranker scores are not conclusive."""
+    if ranker and enable_reranker:
+        context_reranker = RunnableAssign({
+            "context":
+                lambda input: ranker.compress_documents(query=input['question'], documents=input['context'])
+        })
+
+        docs = retriever.invoke(query, config={'run_name':'retriever'})
+        docs = context_reranker.invoke({"context": docs, "question": query}, config={'run_name':'context_reranker'})
+        original_docs = docs.get("context", [])
+    else:
+        original_docs = retriever.invoke(query, config={'run_name':'retriever'})
+
+    band = RELEVANCE_GATE.band(original_docs) if ranker and enable_reranker else "llm"
+    if band == "accept":
+        return original_docs, 2
+    if band == "reject":
+        return original_docs, 0
+
+    context_text = "\n".join(d.page_content for d in original_docs)
+    relevance_score = _retry_score_generation(
+        relevance_chain,
+        {"query": query, "context": context_text},
+        config={'run_name':'relevance-checker'}
+    )
+    return original_docs, relevance_score
+
+
+def _generate_candidate_queries(query: str, reflection_llm, num_candidates: int) -> List[str]:
+    """Generate up to num_candidates distinct rewrites of a query with a single LLM call"""
+    candidates_template = ChatPromptTemplate.from_messages([
+        ("system", prompts["reflection_parallel_query_rewriter_prompt"]["system"]),
+        ("human", "{query}")
+    ])
+    candidates_chain = candidates_template | reflection_llm | StrOutputParser()
+    response = candidates_chain.invoke(
+        {"query": query, "num_candidates": num_candidates}, config={'run_name':'parallel-query-rewriter'}
+    )
+
+    candidates = []
+    for line in response.splitlines():
+        candidate = _CANDIDATE_PREFIX.sub("", line).strip().strip('"')
+        if candidate and candidate != query and candidate not in candidates:
+            candidates.append(candidate)
+    return candidates[:num_candidates]
+
+
+def _parallel_context_relevance(retriever_query: str,
+                                retriever,
+                                ranker,
+                                reflection_counter: ReflectionCounter,
+                                enable_reranker: bool,
+                                reflection_llm,
+                                relevance_chain,
+                                relevance_threshold: int) -> Tuple[List[Any], bool]:
+    """Score the original query while rewrites are generated. If it is not relevant enough, score all
+    rewrites concurrently and return the context of the best scoring query."""
+    original_future = _submit(_retrieve_and_score, retriever_query, retriever, ranker, enable_reranker, relevance_chain)
+    num_candidates = min(REFLECTION_PARALLEL_CANDIDATES, max(0, reflection_counter.max_loops - 1))
+    candidates_future = _submit(_generate_candidate_queries, retriever_query, reflection_llm, num_candidates) if num_candidates else None
+
+    # The rewrites are only retrieved and scored if the original query does not retrieve relevant context
+    best_docs, best_score = original_future.result()
+    reflection_counter.increment()
+    logger.info(f"Context relevance score: {best_score} (threshold: {relevance_threshold})")
+    if best_score >= relevance_threshold or candidates_future is None:
+        if candidates_future is not None:
+            candidates_future.cancel()
+        return best_docs, best_score >= relevance_threshold
+
+    try:
+        candidates = candidates_future.result()
+    except Exception as e:
+        logger.warning(f"Failed to generate rewritten queries: {str(e)}")
+        candidates = []
+    candidate_futures = [
+        _submit(_retrieve_and_score, candidate, retriever, ranker, enable_reranker, relevance_chain)
+        for candidate in candidates
+    ]
+
+    # Ties keep the earlier candidate, the original query first
+    for candidate, future in zip(candidates, candidate_futures):
+        try:
+            docs, score = future.result()
+        except Exception as e:
+            logger.warning(f"Failed to score rewritten query {candidate}: {str(e)}")
+            continue
+        reflection_counter.increment()
+        logger.info(f"Context relevance score: {score} for rewritten query: {candidate}")
+        if score > best_score:
+            best_docs, best_score = docs, score
+
+    return best_docs, best_score >= relevance_threshold
+
+
 def check_context_relevance(retriever_query: str,
                           retriever,
                           ranker,
                           reflection_counter: ReflectionCounter,
                           enable_reranker: bool = True) -> Tuple[List[str], bool]:
     """Check relevance of retrieved context and optionally rewrite query for better results.
+    Queries are rewritten one loop at a time, or all at once with REFLECTION_STRATEGY set to parallel.
     
     Args:
         retriever_query (str): Current query to use for retrieval
@@ -111,31 +283,21 @@ def check_context_relevance(retriever_query: str,
         ("human", "{query}")
     ])
 
+    relevance_chain = relevance_template | reflection_llm | StrOutputParser()
+
+    if REFLECTION_STRATEGY == "parallel":
+        return _parallel_context_relevance(
+            retriever_query, retriever, ranker, reflection_counter, enable_reranker,
+            reflection_llm, relevance_chain, relevance_threshold
+        )
+
     current_query = retriever_query
     
     while reflection_counter.remaining > 0:
+        iteration_start_time = time.perf_counter()
         # Get documents using current query
-        if ranker and enable_reranker:
-            context_reranker = RunnableAssign({
-                "context":
-                    lambda input: ranker.compress_documents(query=input['question'], documents=input['context'])
-            })
-
-            retriever = {"context": retriever} | RunnableAssign({"context": lambda input: input["context"]})
-            docs = retriever.invoke(current_query, config={'run_name':'retriever'})
-            docs = context_reranker.invoke({"context": docs.get("context", []), "question": current_query}, config={'run_name':'context_reranker'})
-            original_docs = docs.get("context", [])
-        else:
-            original_docs = retriever.invoke(current_query, config={'run_name':'retriever'})
-        
-        docs = [d.page_content for d in original_docs]
-
-        context_text = "\n".join(docs)
-        relevance_chain = relevance_template | reflection_llm | StrOutputParser()
-        relevance_score = _retry_score_generation(
-            relevance_chain,
-            {"query": current_query, "context": context_text},
-            config={'run_name':'relevance-checker'}
+        original_docs, relevance_score = _retrieve_and_score(
+            current_query, retriever, ranker, enable_reranker, relevance_chain
         )
         
         logger.info(f"Context relevance score: {relevance_score} (threshold: {relevance_threshold})")
@@ -145,12 +307,120 @@ def check_context_relevance(retriever_query: str,
             return original_docs, True
         
         if reflection_counter.remaining > 0:
+            # Another iteration is expected to take as long as this one, stop if it does not fit the request deadline
+            if not request_time_fits(time.perf_counter() - iteration_start_time):
+                logger.info("Stopping context relevance reflection, no time left before the request deadline")
+                break
             rewrite_chain = query_rewrite_template | reflection_llm | StrOutputParser()
             current_query = rewrite_chain.invoke({"query": current_query}, config={'run_name':'query-rewriter'})
             logger.info(f"Rewritten query (iteration {reflection_counter.current_count}): {current_query}")
     
     return original_docs, False
 
+class StreamingGroundednessChecker:
+    """Checks the groundedness of a streamed response sentence by sentence while it is generated.
+
+    Completed sentences are verified against the context in batches of REFLECTION_GROUNDEDNESS_BATCH_SIZE,
+    each batch with a single reflection LLM call running concurrently with the generation. Verified
+    sentences are returned as annotations without blocking the stream.
+    """
+
+    def __init__(self, context: List[str], batch_size: int = REFLECTION_GROUNDEDNESS_BATCH_SIZE):
+        self.context_text = "\n".join(context)
+        self.batch_size = max(1, batch_size)
+        self.groundedness_threshold = int(os.environ.get("RESPONSE_GROUNDEDNESS_THRESHOLD", 1))
+        reflection_llm_name = get_env_variable(variable_name="REFLECTION_LLM", default_value="mistralai/mixtral-8x22b-instruct-v0.1").strip('"').strip("'")
+        reflection_llm_endpoint = os.environ.get("REFLECTION_LLM_SERVERURL", "").strip('"').strip("'")
+
+        llm_params = {
+            "model": reflection_llm_name,
+            "temperature": 0.2,
+            "top_p": 0.9,
+            "max_tokens": 512
+        }
+
+        if reflection_llm_endpoint:
+            llm_params["llm_endpoint"] = reflection_llm_endpoint
+
+        sentence_groundedness_template = ChatPromptTemplate.from_messages([
+            ("system", prompts["reflection_sentence_groundedness_check_prompt"]["system"]),
+            ("human", "Context: {context}\n\nSentences:\n{sentences}")
+        ])
+        self.verifier_chain = sentence_groundedness_template | get_llm(**llm_params) | StrOutputParser()
+
+        self._buffer = ""
+        self._num_sentences = 0
+        self._pending_sentences: List[Tuple[int, str]] = []
+        self._futures = []
+
+    def feed(self, text: str) -> None:
+        """Add streamed text, submitting a verification once a batch of sentences is complete"""
+        self._buffer += text
+        *sentences, self._buffer = _SENTENCE_BOUNDARY.split(self._buffer)
+        for sentence in sentences:
+            self._add_sentence(sentence)
+        if len(self._pending_sentences) >= self.batch_size:
+            self._submit_pending()
+
+    def completed_annotations(self) -> List[Dict[str, Any]]:
+        """Return the annotations of the sentences verified since the last call, in order, without blocking"""
+        annotations = []
+        while self._futures and self._futures[0].done():
+            annotations.extend(self._futures.pop(0).result())
+        return annotations
+
+    def finish(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Verify the remaining text and return all annotations not returned yet.
+        Batches not verified by the request deadline, or within timeout seconds for requests without one, are dropped."""
+        self._add_sentence(self._buffer)
+        self._buffer = ""
+        self._submit_pending()
+        remaining = remaining_request_time()
+        if remaining is not None:
+            timeout = max(remaining, 0)
+        wait(self._futures, timeout=timeout)
+        annotations = self.completed_annotations()
+        if self._futures:
+            logger.warning(f"Dropping groundedness of {len(self._futures)} sentence batches not verified within {timeout}s")
+            self._futures = []
+        return annotations
+
+    def _add_sentence(self, sentence: str) -> None:
+        sentence = sentence.strip()
+        if sentence:
+            self._pending_sentences.append((self._num_sentences, sentence))
+            self._num_sentences += 1
+
+    def _submit_pending(self) -> None:
+        if self._pending_sentences:
+            self._futures.append(_submit(self._verify, self._pending_sentences, executor=_GROUNDEDNESS_EXECUTOR))
+            self._pending_sentences = []
+
+    def _verify(self, sentences: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+        """Score a batch of sentences with a single reflection LLM call"""
+        numbered_sentences = "\n".join(f"{index}: {sentence}" for index, sentence in sentences)
+        try:
+            response = self.verifier_chain.invoke(
+                {"context": self.context_text, "sentences": numbered_sentences},
+                config={'run_name':'sentence-groundedness-checker'}
+            )
+            scores = {int(index): int(score) for index, score in _SENTENCE_SCORE.findall(response)}
+        except Exception as e:
+            logger.warning(f"Failed to check groundedness of sentences: {str(e)}")
+            scores = {}
+
+        annotations = []
+        for index, sentence in sentences:
+            score = scores.get(index)
+            annotations.append({
+                "index": index,
+                "sentence": sentence,
+                "score": score,
+                "grounded": None if score is None else score >= self.groundedness_threshold,
+            })
+        logger.info(f"Sentence groundedness scores: {[annotation['score'] for annotation in annotations]}")
+        return annotations
+
 def check_response_groundedness(response: str,
                               context: List[str],
                               reflection_counter: ReflectionCounter,
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Request scoped deadlines.
+
+The deadline of a request is set once by the server and read by every pipeline stage through a contextvar,
+so optional stages can be skipped or cut short when the remaining time budget does not allow them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import httpx
+import requests
+
+# Default time budget in milliseconds of requests not setting one, 0 for no deadline
+DEFAULT_REQUEST_DEADLINE_MS = int(os.getenv("DEFAULT_REQUEST_DEADLINE_MS", 0))
+
+_REQUEST_DEADLINE: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# Set while an optional stage runs, its HTTP calls then time out at the request deadline
+_IN_DEADLINE_STAGE: ContextVar[bool] = ContextVar("in_deadline_stage", default=False)
+
+
+def start_request_deadline(budget_ms: Optional[int], start_time: Optional[float] = None) -> Optional[float]:
+    """Set the deadline of the current request context to budget_ms after start_time.
+
+    Args:
+        budget_ms: Time budget of the request in milliseconds, DEFAULT_REQUEST_DEADLINE_MS if None.
+        start_time: time.perf_counter() value at which the request arrived, now if None.
+
+    Returns:
+        The deadline as time.perf_counter() value, None if the request has no deadline.
+    """
+    if budget_ms is None:
+        budget_ms = DEFAULT_REQUEST_DEADLINE_MS
+    deadline = None
+    if budget_ms > 0:
+        deadline = (start_time if start_time is not None else time.perf_counter()) + budget_ms / 1000
+    _REQUEST_DEADLINE.set(deadline)
+    return deadline
+
+
+def remaining_request_time() -> Optional[float]:
+    """Seconds left until the deadline of the current request, None if it has no deadline."""
+    deadline = _REQUEST_DEADLINE.get()
+    if deadline is None:
+        return None
+    return deadline - time.perf_counter()
+
+
+def request_time_fits(expected_duration: float) -> bool:
+    """Return whether work expected to take expected_duration seconds completes before the deadline."""
+    remaining = remaining_request_time()
+    return remaining is None or remaining > expected_duration
+
+
+def stage_timeout() -> Optional[float]:
+    """Timeout in seconds of HTTP calls made by the current optional stage, None outside of one or without deadline."""
+    if not _IN_DEADLINE_STAGE.get():
+        return None
+    remaining = remaining_request_time()
+    if remaining is None:
+        return None
+    return max(remaining, 0.001)
+
+
+@contextmanager
+def deadline_stage() -> Iterator[None]:
+    """Run the enclosed optional stage with its HTTP calls timing out at the request deadline."""
+    token = _IN_DEADLINE_STAGE.set(True)
+    try:
+        yield
+    finally:
+        _IN_DEADLINE_STAGE.reset(token)
+
+
+class DeadlineSession(requests.Session):
+    """Session whose requests made by an optional stage time out at the request deadline."""
+
+    def request(self, method, url, **kwargs):
+        timeout = stage_timeout()
+        if timeout is not None:
+            current = kwargs.get("timeout")
+            kwargs["timeout"] = timeout if not isinstance(current, (int, float)) else min(current, timeout)
+        return super().request(method, url, **kwargs)
+
+
+class DeadlineHttpxClient(httpx.Client):
+    """HTTP client whose requests made by an optional stage time out at the request deadline."""
+
+    def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        timeout = stage_timeout()
+        if timeout is not None:
+            current = httpx.Timeout(**request.extensions["timeout"]) if "timeout" in request.extensions else None
+            if current is not None and current.read is not None:
+                timeout = min(timeout, current.read)
+            request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
+        return super().send(request, **kwargs)
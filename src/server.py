@@ -26,7 +26,7 @@ from typing import Union
 from uuid import uuid4
 
 import bleach
-from fastapi import FastAPI, Request, File, Form, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import FastAPI, Request, Response, File, Form, Depends, HTTPException, Query, BackgroundTasks
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
@@ -42,13 +42,19 @@ from pymilvus.exceptions import MilvusUnavailableException
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 from langchain_core.documents import Document
 from src.chains import UnstructuredRAG
+from src.circuit_breaker import record_request_degradation, start_request_degradations
+from src.reflection import StreamingGroundednessChecker
+from src.request_deadline import request_time_fits, start_request_deadline
+from src.observability.request_timings import start_request_timings
 from .utils import (
     get_config,
+    get_llm_client_cache_info,
     get_minio_operator,
     get_unique_thumbnail_id,
     check_and_print_services_health,
     check_all_services_health,
-    print_health_report
+    print_health_report,
+    DependencyHealthProber
 )
 
 logging.basicConfig(level=os.environ.get('LOGLEVEL', 'INFO').upper())
@@ -95,13 +101,32 @@ FALLBACK_EXCEPTION_MSG = "Error from rag-server. Please check rag-server logs fo
 # Log server initialization details first
 logger.info("Initializing NVIDIA RAG server...")
 
-UNSTRUCTURED_RAG = UnstructuredRAG()
-
 settings = get_config()
 metrics = None
 if settings.tracing.enabled:
     from .tracing import instrument
     metrics = instrument(app, settings)
+    if metrics:
+        metrics.observe_llm_client_cache(get_llm_client_cache_info)
+
+UNSTRUCTURED_RAG = UnstructuredRAG(metrics=metrics)
+
+# Dependency health is checked in the background every HEALTH_CHECK_INTERVAL seconds, 0 checks on every request
+HEALTH_PROBER = DependencyHealthProber(interval=float(os.getenv("HEALTH_CHECK_INTERVAL", 30)))
+# Seconds the final chunk waits for the groundedness of the last sentences of a response without a deadline,
+# responses with a deadline wait until it
+STREAMING_GROUNDEDNESS_FINISH_TIMEOUT = float(os.getenv("STREAMING_GROUNDEDNESS_FINISH_TIMEOUT", 10))
+
+
+@app.on_event("startup")
+async def start_health_prober():
+    HEALTH_PROBER.start()
+
+
+@app.on_event("shutdown")
+async def stop_health_prober():
+    await HEALTH_PROBER.stop()
+
 
 class Message(BaseModel):
     """Definition of the Chat Message type."""
@@ -219,6 +244,22 @@ class Prompt(BaseModel):
         description="Enable or disable citations as part of response.",
         default=os.getenv("ENABLE_CITATIONS", "True").lower() in ["true", "True"],
     )
+    enable_timings: bool = Field(
+        description="Enable or disable the breakdown of stage timings in milliseconds as part of the final response chunk "
+        "and the Server-Timing header.",
+        default=False,
+    )
+    enable_groundedness: bool = Field(
+        description="Enable or disable sentence level groundedness annotations of the streamed response, checked against "
+        "the retrieved context by the reflection LLM while the response is generated.",
+        default=os.getenv("ENABLE_STREAMING_GROUNDEDNESS", "False").lower() in ["true", "True"],
+    )
+    deadline_ms: Optional[int] = Field(
+        description="Time budget in milliseconds until the first token. Optional stages like query rewriting, reranking, "
+        "reflection and citations are skipped when they do not fit. Defaults to the X-Request-Deadline-Ms header.",
+        default=None,
+        ge=0,
+    )
     model: str = Field(
         description="Name of NIM LLM model to be used for inference.",
         default=os.getenv("APP_LLM_MODELNAME", "").strip('"'),
@@ -438,6 +479,19 @@ class Citations(BaseModel):
         default=[], description="List of document results"
     )
 
+class SentenceGroundedness(BaseModel):
+    """Groundedness of a single sentence of the response"""
+
+    index: int = Field(description="Position of the sentence in the response, starting at 0", ge=0, format="int64")
+    sentence: str = Field(description="Text of the sentence", max_length=131072, pattern=r'[\s\S]*')
+    score: Optional[int] = Field(
+        default=None, ge=0, le=2, description="Groundedness score between 0 and 2, null if it could not be checked"
+    )
+    grounded: Optional[bool] = Field(
+        default=None, description="Whether the score reaches RESPONSE_GROUNDEDNESS_THRESHOLD, null if it could not be checked"
+    )
+
+
 class ChainResponse(BaseModel):
     """Definition of Chain APIs resopnse data type"""
 
@@ -450,6 +504,18 @@ class ChainResponse(BaseModel):
     # Place holder fields for now to match generate API response structure
     usage: Optional[Usage] = Field(default=Usage(), description="Token usage statistics")
     citations: Optional[Citations] = Field(default=Citations(), description="Source documents used for the response")
+    timings: Optional[Dict[str, float]] = Field(
+        default=None, description="Stage timings in milliseconds, set on the final chunk if enable_timings is set"
+    )
+    degradations: Optional[List[str]] = Field(
+        default=None,
+        description="Auxiliary models skipped for this response because they were unavailable or too slow, set on the final chunk"
+    )
+    groundedness: Optional[List[SentenceGroundedness]] = Field(
+        default=None,
+        description="Sentences of the response checked since the previous chunk, if enable_groundedness is set. "
+        "The remaining sentences are sent on the final chunk."
+    )
 
 
 class DocumentSearch(BaseModel):
@@ -526,6 +592,16 @@ class DocumentSearch(BaseModel):
         default=os.getenv("APP_RANKING_SERVERURL", "").strip('"'),
         max_length=2048,
     )
+    enable_timings: bool = Field(
+        description="Enable or disable the breakdown of stage timings in milliseconds in the Server-Timing header.",
+        default=False,
+    )
+    deadline_ms: Optional[int] = Field(
+        description="Time budget in milliseconds of the search. Optional stages like query rewriting, reranking and "
+        "reflection are skipped when they do not fit. Defaults to the X-Request-Deadline-Ms header.",
+        default=None,
+        ge=0,
+    )
 
     # Validator to normalize model information
     @field_validator("reranker_endpoint", "embedding_endpoint", "embedding_model", "reranker_model", mode="before")
@@ -574,6 +650,17 @@ async def request_validation_exception_handler(_: Request, exc: RequestValidatio
     )
 
 
+def get_request_budget_ms(request: Request, deadline_ms: Optional[int]) -> Optional[int]:
+    """Time budget of a request from its deadline_ms field, falling back to the X-Request-Deadline-Ms header"""
+    header_value = request.headers.get("x-request-deadline-ms")
+    if deadline_ms is None and header_value:
+        try:
+            deadline_ms = int(header_value)
+        except ValueError:
+            logger.warning("Ignoring invalid X-Request-Deadline-Ms header: %s", header_value)
+    return deadline_ms
+
+
 def error_response_generator(exception_msg: str):
     """
     Generate a stream of data for the error response
@@ -648,7 +735,7 @@ async def health_check(check_dependencies: bool = False):
     # Only perform detailed service checks if requested
     if check_dependencies:
         try:
-            health_results = await check_all_services_health()
+            health_results = await HEALTH_PROBER.get_results()
             print_health_report(health_results)
             
             # Process databases
@@ -724,8 +811,7 @@ def prepare_citations(
                             page_number=page_number,
                             location=location
                         )
-                        payload = MINIO_OPERATOR.get_payload(object_name=unique_thumbnail_id)
-                        content = payload.get("content", "")
+                        content = MINIO_OPERATOR.get_content(object_name=unique_thumbnail_id)
                         source_metadata = SourceMetadata(
                             page_number=page_number,
                             location=location,
@@ -789,11 +875,16 @@ def prepare_citations(
 async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse:
     """Generate and stream the response to the provided prompt."""
 
+    request_start_time = time.perf_counter()
+    timings = start_request_timings() if prompt.enable_timings else None
+    degradations = start_request_degradations()
+    start_request_deadline(get_request_budget_ms(request, prompt.deadline_ms), request_start_time)
     if metrics:
         metrics.update_api_requests(method=request.method, endpoint=request.url.path)
     try:
         chat_history = prompt.messages
         collection_name = prompt.collection_name
+        metric_attributes = {"endpoint": "/generate", "collection": collection_name, "model": prompt.model or ""}
         
         # Helper function to escape JSON-like structures in content
         def escape_json_content(content: str) -> str:
@@ -822,7 +913,7 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
         # All the other information from the prompt like the temperature, top_p etc., are llm_settings
         kwargs = {
             key: value
-            for key, value in vars(prompt).items() if key not in ['messages', 'use_knowledge_base', 'collection_name', 'vdb_top_k', 'reranker_top_k']
+            for key, value in vars(prompt).items() if key not in ['messages', 'use_knowledge_base', 'collection_name', 'vdb_top_k', 'reranker_top_k', 'enable_timings', 'enable_groundedness', 'deadline_ms']
         }
         # pylint: disable=unreachable
         generator = None
@@ -843,18 +934,27 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
 
         def response_generator():
             """Convert generator streaming response into `data: ChainResponse` format for chunk"""
+            nonlocal contexts
             try:
                 # unique response id for every query
                 resp_id = str(uuid4())
+                # Sentences are checked concurrently with the generation and annotated on the chunks once scored
+                groundedness_checker = None
+                if prompt.enable_groundedness and contexts:
+                    groundedness_checker = StreamingGroundednessChecker(
+                        [getattr(context, "page_content", str(context)) for context in contexts]
+                    )
                 if generator:
                     logger.debug("Generated response chunks\n")
                     # Create ChainResponse object for every token generated
                     first_chunk = True
+                    first_token_time = None
                     for chunk in generator:
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
                         # TODO: This is a hack to clear contexts if we get an error response from nemoguardrails
                         if chunk == "I'm sorry, I can't respond to that.":
                             # Clear contexts if we get an error response
-                            nonlocal contexts
                             contexts = list()
                         chain_response = ChainResponse()
                         response_choice = ChainResponseChoices(
@@ -870,12 +970,30 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
                         chain_response.object = "chat.completion.chunk"
                         chain_response.created = int(time.time())
                         if first_chunk:
+                            enable_citations = prompt.enable_citations
+                            if enable_citations and not request_time_fits(0):
+                                # Send the first token without fetching citations once the deadline has passed
+                                enable_citations = False
+                                record_request_degradation("citations")
+                                if metrics:
+                                    metrics.record_degradation("citations", "deadline", metric_attributes)
+                            citations_start_time = time.perf_counter()
                             chain_response.citations = prepare_citations(
                                 retrieved_documents=contexts,
                                 collection_name=collection_name,
-                                enable_citations=prompt.enable_citations,
+                                enable_citations=enable_citations,
                             )
+                            citations_duration = time.perf_counter() - citations_start_time
+                            if metrics:
+                                metrics.record_stage_duration("citations", citations_duration, metric_attributes)
+                            if timings:
+                                timings.add("citations", citations_duration)
                             first_chunk = False
+                        if groundedness_checker:
+                            groundedness_checker.feed(chunk)
+                            annotations = groundedness_checker.completed_annotations()
+                            if annotations:
+                                chain_response.groundedness = [SentenceGroundedness(**annotation) for annotation in annotations]
                         logger.debug(response_choice)
                         # Send generator with tokens in ChainResponse format
                         yield "data: " + str(chain_response.json()) + "\n\n"
@@ -890,8 +1008,24 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
                     chain_response.model = prompt.model
                     chain_response.object = "chat.completion.chunk"
                     chain_response.created = int(time.time())
+                    end_time = time.perf_counter()
+                    if groundedness_checker:
+                        chain_response.groundedness = [
+                            SentenceGroundedness(**annotation)
+                            for annotation in groundedness_checker.finish(STREAMING_GROUNDEDNESS_FINISH_TIMEOUT)
+                        ]
+                    if degradations:
+                        chain_response.degradations = degradations
+                    if timings and first_token_time is not None:
+                        timings.add("ttft", first_token_time - request_start_time)
+                        timings.add("generation", end_time - first_token_time)
+                        timings.add("total", end_time - request_start_time)
+                        chain_response.timings = timings.as_milliseconds()
                     logger.debug(response_choice)
                     yield "data: " + str(chain_response.json()) + "\n\n"
+                    if metrics and first_token_time is not None:
+                        metrics.record_generation(first_token_time - request_start_time, end_time - first_token_time, metric_attributes)
+                        metrics.record_request_duration(end_time - request_start_time, metric_attributes)
                 else:
                     chain_response = ChainResponse()
                     yield "data: " + str(chain_response.json()) + "\n\n"
@@ -900,7 +1034,11 @@ async def generate_answer(request: Request, prompt: Prompt) -> StreamingResponse
                 logger.exception("Error from response generator in /generate endpoint. Error details: %s", e)
                 yield from error_response_generator(FALLBACK_EXCEPTION_MSG)
         
-        return StreamingResponse(response_generator(), media_type="text/event-stream")
+        # Stages completed before streaming starts, the full breakdown is sent in the final chunk
+        headers = {"Server-Timing": timings.server_timing_header()} if timings and timings.stages else {}
+        if degradations:
+            headers["X-RAG-Degraded"] = ",".join(degradations)
+        return StreamingResponse(response_generator(), media_type="text/event-stream", headers=headers)
         # pylint: enable=unreachable
     except asyncio.CancelledError as e:
         logger.warning(f"Request cancelled during response generation. {str(e)}")
@@ -975,24 +1113,41 @@ async def v1_chat_completions(request: Request, prompt: Prompt) -> StreamingResp
         }
     },
 )
-async def document_search(request: Request, data: DocumentSearch) -> Dict[str, List[Dict[str, Any]]]:
+async def document_search(request: Request, response: Response, data: DocumentSearch) -> Dict[str, List[Dict[str, Any]]]:
     """Search for the most relevant documents for the given search parameters."""
 
+    request_start_time = time.perf_counter()
+    timings = start_request_timings() if data.enable_timings else None
+    degradations = start_request_degradations()
+    start_request_deadline(get_request_budget_ms(request, data.deadline_ms), request_start_time)
     if metrics:
         metrics.update_api_requests(method=request.method, endpoint=request.url.path)
     try:
         if hasattr(UNSTRUCTURED_RAG, "document_search") and callable(UNSTRUCTURED_RAG.document_search):
 
             # All the other information from the data are in kwargs like embedding model, embedding url
-            excluded_keys = {"query", "reranker_top_k", "vdb_top_k", "collection_name", "messages"}
+            excluded_keys = {"query", "reranker_top_k", "vdb_top_k", "collection_name", "messages", "enable_timings", "deadline_ms"}
             kwargs = {key: value for key, value in vars(data).items() if key not in excluded_keys}
 
             docs = UNSTRUCTURED_RAG.document_search(content=data.query, messages=data.messages, reranker_top_k=data.reranker_top_k, vdb_top_k=data.vdb_top_k, collection_name=data.collection_name, **kwargs)
+            citations_start_time = time.perf_counter()
             citations = prepare_citations(
                 collection_name=data.collection_name,
                 retrieved_documents=docs,
                 force_citations=True
             )
+            citations_duration = time.perf_counter() - citations_start_time
+            request_duration = time.perf_counter() - request_start_time
+            if metrics:
+                metric_attributes = {"endpoint": "/search", "collection": data.collection_name, "model": data.embedding_model or ""}
+                metrics.record_stage_duration("citations", citations_duration, metric_attributes)
+                metrics.record_request_duration(request_duration, metric_attributes)
+            if timings:
+                timings.add("citations", citations_duration)
+                timings.add("total", request_duration)
+                response.headers["Server-Timing"] = timings.server_timing_header()
+            if degradations:
+                response.headers["X-RAG-Degraded"] = ",".join(degradations)
             return citations
         raise NotImplementedError("UnstructuredRAG class has not implemented the document_search method.")
 
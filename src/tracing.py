@@ -20,6 +20,7 @@ from opentelemetry import trace
 from opentelemetry import metrics
 from opentelemetry.sdk.resources import SERVICE_NAME, Resource
 from opentelemetry.sdk.trace import TracerProvider, Span
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
@@ -74,7 +75,9 @@ def instrument(app: FastAPI, settings):
         otel_metrics = OtelMetrics(service_name="rag")
 
         # Oberservability Tracing
-        trace.set_tracer_provider(TracerProvider(resource=resource))
+        # Sampled at the root span, children follow the decision of their parent
+        sampler = ParentBased(TraceIdRatioBased(settings.tracing.sample_ratio))
+        trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
         exporter_http = None
         if settings.tracing.otlp_http_endpoint != "":
             logger.debug(
@@ -91,7 +94,12 @@ def instrument(app: FastAPI, settings):
             BaggageSpanProcessor(ALLOW_ALL_BAGGAGE_KEYS)
         )
         trace.get_tracer_provider().add_span_processor(span_processor)
-        LangchainInstrumentor().instrument(tracer_provider=trace.get_tracer_provider(), metrics=otel_metrics)
+        LangchainInstrumentor().instrument(
+            tracer_provider=trace.get_tracer_provider(),
+            metrics=otel_metrics,
+            token_events=settings.tracing.token_events,
+            max_active_spans=settings.tracing.max_active_spans,
+        )
         MilvusInstrumentor().instrument(tracer_provider=trace.get_tracer_provider())
         FastAPIInstrumentor().instrument_app(
             app,
@@ -13,8 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Utility functions used across different modules of the RAG."""
+import json
 import logging
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from functools import lru_cache
 from functools import wraps
 from pathlib import Path
@@ -26,6 +31,7 @@ from typing import Any
 from typing import Optional
 from urllib.parse import urlparse
 
+import httpx
 import requests
 import yaml
 import math
@@ -64,6 +70,7 @@ except Exception:
 
 try:
     from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.document_loaders import UnstructuredFileLoader
     from langchain_community.embeddings import HuggingFaceEmbeddings
 except Exception:
     logger.warning("Optional Langchain module langchain_community not installed.")
@@ -87,6 +94,7 @@ except Exception:
     logger.warning("Optional nv_ingest_client module not installed.")
 
 from src.minio_operator import MinioOperator
+from src.request_deadline import DeadlineHttpxClient, DeadlineSession
 from . import configuration  # noqa: E402
 
 if TYPE_CHECKING:
@@ -94,6 +102,12 @@ if TYPE_CHECKING:
 
 DEFAULT_MAX_CONTEXT = 1500
 ENABLE_NV_INGEST_VDB_UPLOAD = True # When enabled entire ingestion would be performed using nv-ingest
+UPLOAD_FOLDER = "/tmp-data/uploaded_files" # Uploaded files are stored in vector DB with this path prefix
+
+# Single worker executor for milvus flush/compaction, scheduled after deletions
+_MILVUS_MAINTENANCE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="milvus-maintenance")
+_PENDING_MILVUS_FLUSHES = set()
+_PENDING_MILVUS_FLUSHES_LOCK = threading.Lock()
 
 # pylint: disable=unnecessary-lambda-assignment
 
@@ -256,6 +270,79 @@ def get_vectorstore(
     return create_vectorstore_langchain(document_embedder, collection_name, vdb_endpoint)
 
 
+class AdaptiveBatchSize:
+    """Batch size for embedding and vectorstore uploads adapted from observed upload latency.
+
+    The batch size is doubled while batches complete well within the target latency and halved
+    when a batch exceeds it, staying within [min_size, max_size].
+    """
+
+    def __init__(self, initial_size: int, min_size: int, max_size: int, target_latency: float):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.target_latency = target_latency
+        self._lock = threading.Lock()
+
+    def observe(self, batch_size: int, latency: float) -> None:
+        """Update the batch size with the latency of a completed batch"""
+        with self._lock:
+            if latency > self.target_latency:
+                self.size = max(self.min_size, self.size // 2)
+            elif latency < self.target_latency / 2 and batch_size >= self.size:
+                self.size = min(self.max_size, self.size * 2)
+
+
+# Shared across uploads so that the learned batch size carries over between ingestion jobs
+EMBEDDING_UPLOAD_BATCH_SIZE = AdaptiveBatchSize(
+    initial_size=int(os.getenv("EMBEDDING_UPLOAD_BATCH_SIZE", 64)),
+    min_size=int(os.getenv("EMBEDDING_UPLOAD_MIN_BATCH_SIZE", 8)),
+    max_size=int(os.getenv("EMBEDDING_UPLOAD_MAX_BATCH_SIZE", 512)),
+    target_latency=float(os.getenv("EMBEDDING_UPLOAD_TARGET_LATENCY", 2.0))
+)
+
+
+def add_documents_pipelined(
+        vectorstore: VectorStore,
+        documents: List["Document"],
+        concurrency: int = int(os.getenv("EMBEDDING_UPLOAD_CONCURRENCY", 4)),
+        max_payload_bytes: int = int(os.getenv("EMBEDDING_UPLOAD_MAX_PAYLOAD_BYTES", 1024 * 1024))) -> None:
+    """Embed and add documents to the vectorstore keeping several batches in flight.
+
+    Each batch is embedded and inserted by its own worker, so the insertion of one batch overlaps with the
+    embedding of the next ones. Batches are sized by EMBEDDING_UPLOAD_BATCH_SIZE and capped at max_payload_bytes of text.
+    """
+    def _add_batch(batch: List["Document"]) -> float:
+        start_time = time.time()
+        vectorstore.add_documents(batch)
+        return time.time() - start_time
+
+    def _next_batch(start: int) -> List["Document"]:
+        batch, payload_bytes = [], 0
+        for document in documents[start:start + EMBEDDING_UPLOAD_BATCH_SIZE.size]:
+            payload_bytes += len(document.page_content.encode("utf-8"))
+            if batch and payload_bytes > max_payload_bytes:
+                break
+            batch.append(document)
+        return batch
+
+    index = 0
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="vdb-upload") as executor:
+        while index < len(documents) or in_flight:
+            while index < len(documents) and len(in_flight) < max(1, concurrency):
+                batch = _next_batch(index)
+                index += len(batch)
+                in_flight[executor.submit(_add_batch, batch)] = len(batch)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_size = in_flight.pop(future)
+                latency = future.result()
+                EMBEDDING_UPLOAD_BATCH_SIZE.observe(batch_size, latency)
+                logger.debug("Added %d documents to vectorstore in %.2fs, next batch size %d", batch_size, latency, EMBEDDING_UPLOAD_BATCH_SIZE.size)
+
+
 def create_collections(collection_names: List[str], vdb_endpoint: str, dimension: int = 768, collection_type: str = "text") -> Dict[str, any]:
     """
     Create multiple collections in the Milvus vector database.
@@ -419,16 +506,42 @@ def delete_collections(vdb_endpoint: str, collection_names: List[str]) -> dict:
             "total_failed": len(collection_names)
         }
 
-@utils_cache
-@lru_cache()
+# Sampling parameters applied per call on the shared llm clients
+LLM_GENERATION_PARAMETERS = ("temperature", "top_p", "max_tokens")
+# Maximum number of llm clients kept, one per model engine, endpoint, model and guardrails setting
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", 32))
+# Maximum number of keep-alive connections per llm endpoint
+LLM_CONNECTION_POOL_SIZE = int(os.getenv("LLM_CONNECTION_POOL_SIZE", 32))
+
+
 def get_llm(**kwargs) -> LLM | SimpleChatModel:
-    """Create the LLM connection."""
-    settings = get_config()
-    
-    # Check if guardrails are enabled
+    """Create the LLM connection.
+
+    The client is shared by all requests to the same model engine, endpoint and model, temperature, top_p and
+    max_tokens are bound to the returned runnable and sent with each call.
+    """
     enable_guardrails = os.getenv("ENABLE_GUARDRAILS", "False").lower() == "true" and kwargs.get('enable_guardrails', False) == True
+    llm_endpoint = kwargs.get('llm_endpoint') or ""
+    if llm_endpoint == '""':
+        llm_endpoint = ""
+    client = _get_llm_client(kwargs.get('model'), llm_endpoint, enable_guardrails)
+    generation_parameters = {
+        key: kwargs[key] for key in LLM_GENERATION_PARAMETERS if kwargs.get(key) is not None
+    }
+    return client.bind(**generation_parameters) if generation_parameters else client
+
+
+def get_llm_client_cache_info():
+    """Hits, misses, current and maximum size of the shared llm client cache."""
+    return _get_llm_client.cache_info()
+
+
+@lru_cache(maxsize=LLM_CLIENT_CACHE_SIZE)
+def _get_llm_client(model: str, llm_endpoint: str, enable_guardrails: bool) -> LLM | SimpleChatModel:
+    """Create an llm client without generation parameters, cached per model engine, endpoint and model."""
+    settings = get_config()
 
-    logger.info("Using %s as model engine for llm. Model name: %s", settings.llm.model_engine, kwargs.get('model'))
+    logger.info("Using %s as model engine for llm. Model name: %s", settings.llm.model_engine, model)
     if settings.llm.model_engine == "nvidia-ai-endpoints":
 
         # Use ChatOpenAI with guardrails if enabled
@@ -444,44 +557,71 @@ def get_llm(**kwargs) -> LLM | SimpleChatModel:
                     if not guardrails_url.startswith(('http://', 'https://')):
                         guardrails_url = 'http://' + guardrails_url
                         
-                    # Try to connect with a timeout of 5 seconds
+                    # Try to connect with a timeout of 5 seconds, only once per cached client
                     response = requests.get(guardrails_url + "/v1/health", timeout=5)
                     response.raise_for_status()
                     
                     x_model_authorization = {"X-Model-Authorization": os.environ.get("NVIDIA_API_KEY", "")}
-                    return ChatOpenAI(
-                        model_name=kwargs.get('model'),
+                    return _log_llm_client_created(ChatOpenAI(
+                        model_name=model,
                         openai_api_base=f"{guardrails_url}/v1/guardrail",
                         openai_api_key="dummy-value", 
                         default_headers=x_model_authorization,
-                        temperature=kwargs.get('temperature', None),
-                        top_p=kwargs.get('top_p', None),
-                        max_tokens=kwargs.get('max_tokens', None)
-                    )
+                        http_client=DeadlineHttpxClient(
+                            limits=httpx.Limits(max_connections=LLM_CONNECTION_POOL_SIZE, max_keepalive_connections=LLM_CONNECTION_POOL_SIZE)
+                        ),
+                    ))
                 except (requests.RequestException, requests.ConnectionError) as e:
                     error_msg = f"Failed to connect to guardrails service at {guardrails_url}: {str(e)} Make sure the guardrails service is running and accessible."
                     logger.error(error_msg)
                     raise RuntimeError(error_msg)
         
-        if kwargs.get('llm_endpoint') and kwargs.get('llm_endpoint') != '""':
-            logger.info(f"Length of string {len(kwargs.get('llm_endpoint'))}")
-            logger.info("Using llm model %s hosted at %s", kwargs.get('model'), kwargs.get('llm_endpoint'))
-            return ChatNVIDIA(base_url=f"http://{kwargs.get('llm_endpoint')}/v1",
-                              model=kwargs.get('model'),
-                              temperature=kwargs.get('temperature', None),
-                              top_p=kwargs.get('top_p', None),
-                              max_tokens=kwargs.get('max_tokens', None))
-
-        logger.info("Using llm model %s from api catalog", kwargs.get('model'))
-        return ChatNVIDIA(model=kwargs.get('model'),
-                          temperature=kwargs.get('temperature', None),
-                          top_p=kwargs.get('top_p', None),
-                          max_tokens=kwargs.get('max_tokens', None))
+        if llm_endpoint:
+            logger.info("Using llm model %s hosted at %s", model, llm_endpoint)
+            return _log_llm_client_created(_share_http_session(ChatNVIDIA(base_url=f"http://{llm_endpoint}/v1", model=model)))
+
+        logger.info("Using llm model %s from api catalog", model)
+        return _log_llm_client_created(_share_http_session(ChatNVIDIA(model=model)))
 
     raise RuntimeError(
         "Unable to find any supported Large Language Model server. Supported engine name is nvidia-ai-endpoints.")
 
 
+def _log_llm_client_created(client: LLM | SimpleChatModel) -> LLM | SimpleChatModel:
+    cache_info = _get_llm_client.cache_info()
+    logger.info(
+        "Created llm client, %s clients cached of at most %s (hits %s, misses %s)",
+        cache_info.currsize + 1, cache_info.maxsize, cache_info.hits, cache_info.misses,
+    )
+    return client
+
+
+@lru_cache(maxsize=LLM_CLIENT_CACHE_SIZE)
+def _get_llm_http_session(base_url: str) -> requests.Session:
+    """Keep-alive session shared by the llm and ranking clients of an endpoint.
+    Calls made by optional pipeline stages time out at the request deadline."""
+    session = DeadlineSession()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LLM_CONNECTION_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _share_http_session(client):
+    """Make a ChatNVIDIA or NVIDIARerank client reuse the keep-alive connections of its endpoint.
+    The connector opens a new session, and with it a new connection, for every call otherwise."""
+    nvidia_client = getattr(client, "_client", None)
+    if nvidia_client is not None and hasattr(nvidia_client, "get_session_fn"):
+        session = _get_llm_http_session(getattr(nvidia_client, "base_url", "") or "")
+        nvidia_client.get_session_fn = lambda: session
+    else:
+        logger.warning(
+            "Unable to share the http session of %s, its calls neither reuse connections nor time out at the request deadline",
+            type(client).__name__,
+        )
+    return client
+
+
 @lru_cache
 def get_embedding_model(model: str, url: str) -> Embeddings:
     """Create the embedding model."""
@@ -534,13 +674,13 @@ def get_ranking_model(model="", url="", top_n=4) -> BaseDocumentCompressor:
         if settings.ranking.model_engine == "nvidia-ai-endpoints":
             if url:
                 logger.info("Using ranking model hosted at %s", url)
-                return NVIDIARerank(base_url=f"http://{url}/v1",
-                                    top_n=top_n,
-                                    truncate="END")
+                return _share_http_session(NVIDIARerank(base_url=f"http://{url}/v1",
+                                                        top_n=top_n,
+                                                        truncate="END"))
 
             if model:
                 logger.info("Using ranking model %s hosted at api catalog", model)
-                return NVIDIARerank(model=model, top_n=top_n, truncate="END")
+                return _share_http_session(NVIDIARerank(model=model, top_n=top_n, truncate="END"))
         else:
             logger.warning("Unable to find any supported ranking model. Supported engine is nvidia-ai-endpoints.")
     except Exception as e:
@@ -557,6 +697,18 @@ def get_text_splitter() -> RecursiveCharacterTextSplitter:
     )
 
 
+def load_and_split_document(filepath: str) -> List["Document"]:
+    """Parse a file using unstructured and split it into chunks.
+
+    Kept free of module state so that it can be run in worker processes of the ingestion process pool.
+    """
+    raw_documents = UnstructuredFileLoader(filepath).load()
+    if not raw_documents:
+        logger.warning("No documents available to process in %s!", filepath)
+        return []
+    return get_text_splitter().split_documents(raw_documents)
+
+
 def get_docs_vectorstore_langchain(vectorstore: VectorStore) -> List[str]:
     """Retrieves filenames stored in the vector store implemented in LangChain."""
 
@@ -576,29 +728,94 @@ def get_docs_vectorstore_langchain(vectorstore: VectorStore) -> List[str]:
     return []
 
 
-def del_docs_vectorstore_langchain(vectorstore: VectorStore, filenames: List[str]) -> bool:
-    """Delete documents from the vector index implemented in LangChain."""
+def _schedule_milvus_flush(collection: "Collection") -> None:
+    """Flush and compact a milvus collection in the background.
+
+    Deleted entities are already invisible to search once the delete call returns,
+    flush and compaction only seal the segments and reclaim space so they are kept off the request path.
+    Requests for a collection which already has a pending flush are coalesced.
+    """
+    with _PENDING_MILVUS_FLUSHES_LOCK:
+        if collection.name in _PENDING_MILVUS_FLUSHES:
+            return
+        _PENDING_MILVUS_FLUSHES.add(collection.name)
+
+    def _flush_and_compact():
+        with _PENDING_MILVUS_FLUSHES_LOCK:
+            _PENDING_MILVUS_FLUSHES.discard(collection.name)
+        try:
+            collection.flush()
+            collection.compact()
+            logger.info("Background flush and compaction triggered for collection %s", collection.name)
+        except Exception as e:
+            logger.error("Background flush of collection %s failed: %s", collection.name, e)
+
+    _MILVUS_MAINTENANCE_EXECUTOR.submit(_flush_and_compact)
+
+
+def del_docs_vectorstore_langchain(vectorstore: VectorStore, filenames: List[str]) -> Dict[str, Optional[int]]:
+    """Delete documents from the vector index implemented in LangChain.
+
+    Filenames are deleted in batches of MILVUS_DELETE_BATCH_SIZE using a single `in [...]` expression per batch.
+    A failing batch does not stop the remaining batches from being deleted.
+
+    Returns:
+        Dict[str, Optional[int]]: Number of deleted chunks for every requested filename, 0 if nothing was deleted
+        and None if the deletion of its batch failed, in which case its chunks may or may not have been deleted.
+    """
 
     settings = get_config()
-    upload_folder = "/tmp-data/uploaded_files"
+    deleted_counts = {filename: 0 for filename in filenames}
+    if settings.vector_store.name != "milvus" or not filenames:
+        return deleted_counts
+
+    batch_size = max(1, int(os.getenv("MILVUS_DELETE_BATCH_SIZE", 100)))
     deleted = False
+    for i in range(0, len(filenames), batch_size):
+        batch = filenames[i:i + batch_size]
+        source_values = {os.path.join(UPLOAD_FOLDER, filename): filename for filename in batch}
+        # json.dumps gives double quoted, escaped string literals understood by milvus expressions
+        expr = "source['source_name'] in [" + ", ".join(json.dumps(value) for value in source_values) + "]"
+        try:
+            # The delete response only carries the total count of the batch, the chunks of a batch of several
+            # files are counted per file by a single paged query
+            if len(batch) > 1:
+                for source_name in _query_source_names(vectorstore.col, expr):
+                    if source_name in source_values:
+                        deleted_counts[source_values[source_name]] += 1
+                if not any(deleted_counts[filename] for filename in batch):
+                    logger.info("None of the files %s exist in the vectorstore", batch)
+                    continue
+
+            resp = vectorstore.col.delete(expr)
+            if len(batch) == 1:
+                deleted_counts[batch[0]] = resp.delete_count
+            deleted = deleted or resp.delete_count > 0
+            logger.info("Deleted %s chunks for %s files from the vectorstore", resp.delete_count, len(batch))
+        except Exception as e:
+            logger.error("Error occurred while deleting documents %s, they may be partially deleted: %s", batch, e)
+            for filename in batch:
+                deleted_counts[filename] = None
+
+    if deleted:
+        _schedule_milvus_flush(vectorstore.col)
+    return deleted_counts
+
+
+def _query_source_names(collection, expr: str) -> Iterable[str]:
+    """Source names of all chunks matching the expression, paged to stay within the milvus query result limit"""
+    iterator = collection.query_iterator(
+        batch_size=int(os.getenv("MILVUS_QUERY_PAGE_SIZE", 16384)), expr=expr, output_fields=["source"]
+    )
     try:
-        for filename in filenames:
-            source_value =  os.path.join(upload_folder, filename)
-            if settings.vector_store.name == "milvus":
-                # Delete Milvus Entities
-                resp = vectorstore.col.delete(f"source['source_name'] == '{source_value}'")
-                deleted = True
-                if resp.delete_count == 0:
-                    logger.info("File does not exist in the vectorstore")
-                    return False
-        if deleted and settings.vector_store.name == "milvus":
-            # Force flush the vectorstore after deleting documents to ensure that the changes are reflected in the vectorstore
-            vectorstore.col.flush()
-        return True
-    except Exception as e: #TODO - propagate the exception
-        logger.error("Error occurred while deleting documents: %s", e)
-        return False
+        while True:
+            rows = iterator.next()
+            if not rows:
+                return
+            for row in rows:
+                yield (row.get("source") or {}).get("source_name")
+    finally:
+        iterator.close()
 
 
 def _combine_dicts(dict_a, dict_b):
@@ -894,6 +1111,10 @@ def get_streaming_filter_think_parser():
         # If filtering is disabled, use a passthrough that passes content as-is
         return RunnablePassthrough()
 
+def normalize_relevance_score(score: float) -> float:
+    """Normalize a reranker logit to be between 0 and 1 using a scaled sigmoid function"""
+    return 1 / (1 + math.exp(-score * 0.1))
+
 def normalize_relevance_scores(documents: List["Document"]) -> List["Document"]:
     """
     Normalize relevance scores in a list of documents to be between 0 and 1 using sigmoid function.
@@ -910,10 +1131,7 @@ def normalize_relevance_scores(documents: List["Document"]) -> List["Document"]:
     # Apply sigmoid normalization (1 / (1 + e^-x))
     for doc in documents:
         if 'relevance_score' in doc.metadata:
-            original_score = doc.metadata['relevance_score']
-            scaled_score = original_score * 0.1
-            normalized_score = 1 / (1 + math.exp(-scaled_score))
-            doc.metadata['relevance_score'] = normalized_score
+            doc.metadata['relevance_score'] = normalize_relevance_score(doc.metadata['relevance_score'])
     
     return documents
 
@@ -984,8 +1202,8 @@ async def check_service_health(
     
     return status
 
-async def check_minio_health(endpoint: str, access_key: str, secret_key: str) -> Dict[str, Any]:
-    """Check MinIO server health"""
+async def check_minio_health(endpoint: str, access_key: str, secret_key: str, timeout: int = 5) -> Dict[str, Any]:
+    """Check MinIO server health, the blocking client calls run in a worker thread"""
     status = {
         "service": "MinIO",
         "url": endpoint,
@@ -1000,24 +1218,31 @@ async def check_minio_health(endpoint: str, access_key: str, secret_key: str) ->
         
     try:
         start_time = time.time()
-        minio_operator = MinioOperator(
-            endpoint=endpoint,
-            access_key=access_key,
-            secret_key=secret_key
-        )
-        # Test basic operation - list buckets
-        buckets = minio_operator.client.list_buckets()
+
+        def _list_buckets():
+            minio_operator = MinioOperator(
+                endpoint=endpoint,
+                access_key=access_key,
+                secret_key=secret_key
+            )
+            # Test basic operation - list buckets
+            return minio_operator.client.list_buckets()
+
+        buckets = await asyncio.wait_for(asyncio.to_thread(_list_buckets), timeout=timeout)
         status["status"] = "healthy"
         status["latency_ms"] = round((time.time() - start_time) * 1000, 2)
         status["buckets"] = len(buckets)
+    except asyncio.TimeoutError:
+        status["status"] = "timeout"
+        status["error"] = f"Request timed out after {timeout}s"
     except Exception as e:
         status["status"] = "error"
         status["error"] = str(e)
         
     return status
 
-async def check_milvus_health(url: str) -> Dict[str, Any]:
-    """Check Milvus database health"""
+async def check_milvus_health(url: str, timeout: int = 5) -> Dict[str, Any]:
+    """Check Milvus database health, the blocking client calls run in a worker thread"""
     status = {
         "service": "Milvus",
         "url": url,
@@ -1034,23 +1259,29 @@ async def check_milvus_health(url: str) -> Dict[str, Any]:
         start_time = time.time()
         parsed_url = urlparse(url)
         connection_alias = f"health_check_{parsed_url.hostname}_{parsed_url.port}_{int(time.time())}"
-        
-        # Connect to Milvus
-        connections.connect(
-            connection_alias, 
-            host=parsed_url.hostname, 
-            port=parsed_url.port
-        )
-        
-        # Test basic operation - list collections
-        collections = utility.list_collections(using=connection_alias)
-        
-        # Disconnect
-        connections.disconnect(connection_alias)
-        
+
+        def _list_collections():
+            # Connect to Milvus
+            connections.connect(
+                connection_alias,
+                host=parsed_url.hostname,
+                port=parsed_url.port,
+                timeout=timeout
+            )
+            try:
+                # Test basic operation - list collections
+                return utility.list_collections(timeout=timeout, using=connection_alias)
+            finally:
+                # Disconnect
+                connections.disconnect(connection_alias)
+
+        collections = await asyncio.wait_for(asyncio.to_thread(_list_collections), timeout=timeout)
         status["status"] = "healthy"
         status["latency_ms"] = round((time.time() - start_time) * 1000, 2)
         status["collections"] = len(collections)
+    except asyncio.TimeoutError:
+        status["status"] = "timeout"
+        status["error"] = f"Request timed out after {timeout}s"
     except Exception as e:
         status["status"] = "error"
         status["error"] = str(e)
@@ -1224,12 +1455,70 @@ async def check_all_services_health() -> Dict[str, List[Dict[str, Any]]]:
             })
     
     # Execute all health checks concurrently
-    for category, task in tasks:
-        result = await task
+    task_results = await asyncio.gather(*(task for _, task in tasks))
+    for (category, _), result in zip(tasks, task_results):
         results[category].append(result)
     
     return results
 
+
+class DependencyHealthProber:
+    """
+    Periodically checks the health of all dependent services in the background, so that
+    health endpoints serve the latest results from cache instead of waiting on every check.
+    """
+
+    def __init__(self, interval: float):
+        # Seconds between checks, the prober is disabled if not positive
+        self.interval = interval
+        self.results: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.last_checked: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    async def refresh(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Check all services now and update the cached results"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        checked_at = time.time()
+        async with self._refresh_lock:
+            # Another caller refreshed while this one was waiting for the lock
+            if self.last_checked is not None and self.last_checked >= checked_at:
+                return self.results
+            results = await check_all_services_health()
+            self.results, self.last_checked = results, time.time()
+        return results
+
+    async def get_results(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the cached results, checking now if the prober is not running or the results are stale"""
+        stale = self.last_checked is None or time.time() - self.last_checked > 2 * self.interval
+        if self._task is None or stale:
+            return await self.refresh()
+        return self.results
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Error during background dependency health checks: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start probing in the background, must be called from within the running event loop"""
+        if self.interval > 0 and self._task is None:
+            logger.info("Starting background dependency health checks every %s seconds", self.interval)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
 def print_health_report(health_results: Dict[str, List[Dict[str, Any]]]) -> None:
     """
     Print health status for individual services
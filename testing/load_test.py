@@ -0,0 +1,331 @@
+"""
+Concurrent load test for the rag-server and ingestor-server APIs.
+
+Virtual users are started over the ramp-up period and send requests back to back until the
+duration has elapsed. Streaming /v1/generate responses are parsed as SSE to measure time to
+first token, inter-token latency and tokens/s. Every request carries an x-benchmark-id header
+of the form <benchmark-id>:<endpoint>:<request number>, so traces can be correlated with the run.
+
+Example:
+    python load_test.py --scenario generate=8,search=2 --concurrency 16 --ramp-up 30 --duration 300
+
+Results are written to <output-dir>/<benchmark-id>.json and <output-dir>/<benchmark-id>.html
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import zipfile
+import argparse
+import tempfile
+import statistics
+from html import escape
+from pathlib import Path
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+
+DEFAULT_QUESTIONS = [
+    "What is the document about?",
+    "List key figures mentioned.",
+    "Does it mention future strategy?",
+    "Summarize the document in 3 sentences.",
+]
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".pptx", ".txt", ".md", ".html", ".json", ".png", ".jpeg", ".jpg")
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Sample:
+    """Measurements of a single request"""
+    endpoint: str
+    start: float
+    latency: float = 0.0
+    status: int = 0
+    error: Optional[str] = None
+    ttft: Optional[float] = None
+    inter_token_latencies: List[float] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if self.ttft is None or self.tokens < 2 or self.latency <= self.ttft:
+            return None
+        return (self.tokens - 1) / (self.latency - self.ttft)
+
+
+def load_dataset(dataset_path: str, questions_file: Optional[str]):
+    """Extract documents from the dataset zip and prepare questions
+
+    Questions are read from questions_file (one per line or a JSON list), otherwise from a
+    questions.txt/questions.json in the dataset, otherwise default questions are asked about every document.
+    """
+    extract_dir = tempfile.mkdtemp(prefix="rag-load-test-")
+    with zipfile.ZipFile(dataset_path) as archive:
+        archive.extractall(extract_dir)
+
+    files = sorted(path for path in Path(extract_dir).rglob("*") if path.is_file())
+    documents = [path for path in files if path.suffix.lower() in SUPPORTED_EXTENSIONS]
+
+    question_paths = [Path(questions_file)] if questions_file else [path for path in files if path.stem == "questions"]
+    for path in question_paths:
+        text = path.read_text()
+        questions = json.loads(text) if path.suffix == ".json" else [line.strip() for line in text.splitlines() if line.strip()]
+        if questions:
+            return documents, questions
+
+    questions = list(DEFAULT_QUESTIONS)
+    for document in documents:
+        topic = re.sub(r"[_\-]+", " ", document.stem)
+        questions.extend(question.replace("the document", topic) for question in DEFAULT_QUESTIONS)
+    return documents, questions
+
+
+class LoadTest:
+    """Runs virtual users against the RAG APIs and collects samples"""
+
+    def __init__(self, args: argparse.Namespace, documents: List[Path], questions: List[str]):
+        self.args = args
+        self.documents = documents
+        self.questions = questions
+        self.samples: List[Sample] = []
+        self.request_count = 0
+        self.random = random.Random(args.seed)
+        self.scenario = self._parse_scenario(args.scenario)
+
+    @staticmethod
+    def _parse_scenario(scenario: str) -> Dict[str, float]:
+        """Parse 'generate=8,search=2' into endpoint weights"""
+        weights = {}
+        for part in scenario.split(","):
+            name, _, weight = part.partition("=")
+            if name not in ("generate", "search", "ingest"):
+                raise ValueError(f"Unknown scenario endpoint: {name}")
+            weights[name] = float(weight or 1)
+        return weights
+
+    def _headers(self, endpoint: str) -> Dict[str, str]:
+        self.request_count += 1
+        return {"x-benchmark-id": f"{self.args.benchmark_id}:{endpoint}:{self.request_count}"}
+
+    async def _generate(self, session: aiohttp.ClientSession, sample: Sample) -> None:
+        payload = {
+            "messages": [{"role": "user", "content": self.random.choice(self.questions)}],
+            "use_knowledge_base": True,
+            "max_tokens": self.args.max_tokens,
+            "collection_name": self.args.collection_name,
+        }
+        last_token_time = None
+        async with session.post(f"{self.args.rag_url}/v1/generate", json=payload, headers=self._headers("generate")) as response:
+            sample.status = response.status
+            if response.status != 200:
+                sample.error = (await response.text())[:500]
+                return
+            buffer = b""
+            async for chunk in response.content.iter_any():
+                buffer += chunk
+                while b"\n\n" in buffer:
+                    event, buffer = buffer.split(b"\n\n", 1)
+                    for line in event.decode("utf-8").splitlines():
+                        if not line.startswith("data: "):
+                            continue
+                        data = line[len("data: "):]
+                        if data.strip() == "[DONE]":
+                            continue
+                        choices = json.loads(data).get("choices") or [{}]
+                        content = (choices[0].get("message") or {}).get("content")
+                        if not content:
+                            continue
+                        now = time.perf_counter()
+                        if last_token_time is None:
+                            sample.ttft = now - sample.start
+                        else:
+                            sample.inter_token_latencies.append(now - last_token_time)
+                        last_token_time = now
+                        sample.tokens += 1
+
+    async def _search(self, session: aiohttp.ClientSession, sample: Sample) -> None:
+        payload = {
+            "query": self.random.choice(self.questions),
+            "collection_name": self.args.collection_name,
+        }
+        async with session.post(f"{self.args.rag_url}/v1/search", json=payload, headers=self._headers("search")) as response:
+            sample.status = response.status
+            body = await response.text()
+            if response.status != 200:
+                sample.error = body[:500]
+
+    async def _ingest(self, session: aiohttp.ClientSession, sample: Sample, document: Optional[Path] = None) -> None:
+        document = document or self.random.choice(self.documents)
+        # Unique name per upload, documents which already exist in the collection are rejected
+        upload_name = f"{document.stem}-{uuid.uuid4().hex[:8]}{document.suffix}"
+        form = aiohttp.FormData()
+        form.add_field("documents", document.read_bytes(), filename=upload_name)
+        form.add_field("data", json.dumps({"collection_name": self.args.collection_name}))
+        async with session.post(f"{self.args.ingestor_url}/v1/documents", data=form, headers=self._headers("ingest")) as response:
+            sample.status = response.status
+            body = await response.text()
+            if response.status != 200:
+                sample.error = body[:500]
+
+    async def _user(self, session: aiohttp.ClientSession, start_delay: float, deadline: float) -> None:
+        """Single virtual user sending requests back to back until the deadline"""
+        await asyncio.sleep(start_delay)
+        handlers = {"generate": self._generate, "search": self._search, "ingest": self._ingest}
+        endpoints, weights = zip(*self.scenario.items())
+        while time.perf_counter() < deadline:
+            endpoint = self.random.choices(endpoints, weights)[0]
+            sample = Sample(endpoint=endpoint, start=time.perf_counter())
+            try:
+                await handlers[endpoint](session, sample)
+            except Exception as e:
+                sample.error = f"{type(e).__name__}: {e}"
+            sample.latency = time.perf_counter() - sample.start
+            self.samples.append(sample)
+
+    async def _prepare_collection(self, session: aiohttp.ClientSession) -> None:
+        async with session.post(
+            f"{self.args.ingestor_url}/v1/collections",
+            params={"embedding_dimension": self.args.embedding_dimension},
+            json=[self.args.collection_name]
+        ) as response:
+            response.raise_for_status()
+        # Seed the collection so that generate and search have documents to retrieve
+        for document in self.documents[:self.args.seed_documents]:
+            sample = Sample(endpoint="seed", start=time.perf_counter())
+            await self._ingest(session, sample, document)
+            if sample.error:
+                print(f"[!] Failed to seed {document.name}: {sample.error}")
+
+    async def run(self) -> float:
+        timeout = aiohttp.ClientTimeout(total=self.args.request_timeout)
+        connector = aiohttp.TCPConnector(limit=self.args.concurrency * 2)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            if not self.args.skip_seed:
+                await self._prepare_collection(session)
+            start = time.perf_counter()
+            deadline = start + self.args.ramp_up + self.args.duration
+            await asyncio.gather(*[
+                self._user(session, self.args.ramp_up * i / self.args.concurrency, deadline)
+                for i in range(self.args.concurrency)
+            ])
+            elapsed = time.perf_counter() - start
+            if self.args.cleanup:
+                async with session.delete(f"{self.args.ingestor_url}/v1/collections", json=[self.args.collection_name]) as response:
+                    await response.text()
+        return elapsed
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    if len(values) == 1:
+        return {f"p{p}": values[0] for p in PERCENTILES}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {f"p{p}": quantiles[p - 1] for p in PERCENTILES}
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Dict]:
+    """Aggregate samples into per endpoint statistics"""
+    summary = {}
+    for endpoint in sorted(set(sample.endpoint for sample in samples)):
+        endpoint_samples = [sample for sample in samples if sample.endpoint == endpoint]
+        succeeded = [sample for sample in endpoint_samples if sample.error is None]
+        summary[endpoint] = {
+            "requests": len(endpoint_samples),
+            "errors": len(endpoint_samples) - len(succeeded),
+            "requests_per_second": len(succeeded) / elapsed if elapsed else 0.0,
+            "latency_s": _percentiles([sample.latency for sample in succeeded]),
+        }
+        if endpoint == "generate":
+            summary[endpoint].update({
+                "ttft_s": _percentiles([sample.ttft for sample in succeeded if sample.ttft is not None]),
+                "inter_token_latency_s": _percentiles([itl for sample in succeeded for itl in sample.inter_token_latencies]),
+                "tokens_per_second": _percentiles([sample.tokens_per_second for sample in succeeded if sample.tokens_per_second]),
+            })
+    return summary
+
+
+def write_html(path: Path, report: Dict) -> None:
+    """Write the summary as a static HTML page"""
+    rows = []
+    for endpoint, stats in report["summary"].items():
+        for metric in ("latency_s", "ttft_s", "inter_token_latency_s", "tokens_per_second"):
+            if metric not in stats:
+                continue
+            values = "".join(
+                f"<td>{value:.4f}</td>" if value is not None else "<td>-</td>"
+                for value in stats[metric].values()
+            )
+            rows.append(
+                f"<tr><td>{escape(endpoint)}</td><td>{stats['requests']}</td><td>{stats['errors']}</td>"
+                f"<td>{stats['requests_per_second']:.2f}</td><td>{metric}</td>{values}</tr>"
+            )
+    headers = "".join(f"<th>p{p}</th>" for p in PERCENTILES)
+    config = escape(json.dumps(report["config"], indent=2))
+    path.write_text(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>RAG load test {escape(report['benchmark_id'])}</title>
+<style>body{{font-family:sans-serif}} table{{border-collapse:collapse}} td,th{{border:1px solid #ccc;padding:4px 8px;text-align:right}}</style>
+</head><body>
+<h1>RAG load test {escape(report['benchmark_id'])}</h1>
+<p>Duration {report['elapsed_s']:.1f}s, {report['total_requests']} requests</p>
+<table><tr><th>endpoint</th><th>requests</th><th>errors</th><th>req/s</th><th>metric</th>{headers}</tr>
+{''.join(rows)}
+</table>
+<h2>Configuration</h2><pre>{config}</pre>
+</body></html>
+""")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rag-url", default=os.getenv("RAG_SERVER_URL", "http://localhost:8081"))
+    parser.add_argument("--ingestor-url", default=os.getenv("INGESTOR_SERVER_URL", "http://localhost:8082"))
+    parser.add_argument("--scenario", default="generate=8,search=2",
+                        help="Comma separated endpoint=weight pairs out of generate, search and ingest")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of virtual users")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which virtual users are started")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of full load after ramp-up")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--dataset", default=str(Path(__file__).resolve().parent.parent / "data" / "dataset.zip"))
+    parser.add_argument("--questions-file", default=None)
+    parser.add_argument("--collection-name", default="load_test")
+    parser.add_argument("--embedding-dimension", type=int, default=2048)
+    parser.add_argument("--seed-documents", type=int, default=5, help="Documents ingested before the run")
+    parser.add_argument("--skip-seed", action="store_true", help="Use the existing collection as is")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the collection after the run")
+    parser.add_argument("--benchmark-id", default=f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}")
+    parser.add_argument("--output-dir", default="./results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    documents, questions = load_dataset(args.dataset, args.questions_file)
+    print(f"[*] Loaded {len(documents)} documents and {len(questions)} questions")
+
+    load_test = LoadTest(args, documents, questions)
+    elapsed = asyncio.run(load_test.run())
+
+    report = {
+        "benchmark_id": args.benchmark_id,
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "total_requests": len(load_test.samples),
+        "summary": summarize(load_test.samples, elapsed),
+        "errors": [asdict(sample) for sample in load_test.samples if sample.error][:100],
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / f"{args.benchmark_id}.json").write_text(json.dumps(report, indent=2))
+    write_html(output_dir / f"{args.benchmark_id}.html", report)
+    print(json.dumps(report["summary"], indent=2))
+    print(f"[+] Report written to {output_dir / args.benchmark_id}.json and .html")
+
+
+if __name__ == "__main__":
+    main()
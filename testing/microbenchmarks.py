@@ -0,0 +1,225 @@
+"""
+Microbenchmarks for the CPU-bound hot paths of the rag-server and ingestor-server.
+
+Each benchmark is timed with timeit over several repeats and reported as time per call.
+Results can be stored as a baseline and later runs compared against it, failing when a
+benchmark is slower than the baseline by more than the threshold.
+
+Run from the repository root with the rag-server and ingestor-server requirements installed:
+    python testing/microbenchmarks.py --save-baseline testing/microbenchmarks_baseline.json
+    python testing/microbenchmarks.py --compare testing/microbenchmarks_baseline.json --threshold 0.2
+
+The server modules are imported with MinIO replaced by an in-memory fake, so no MinIO server is needed.
+"""
+
+import os
+import sys
+import json
+import base64
+import random
+import timeit
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark, the decorated function performs setup and returns the callable to time"""
+    def _register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return _register
+
+
+class FakeMinioOperator:
+    """In-memory stand-in for MinioOperator"""
+
+    def __init__(self, content_size: int = 64 * 1024):
+        self.content = base64.b64encode(random.Random(0).randbytes(content_size)).decode("ascii")
+
+    def get_content(self, object_name: str) -> str:
+        return self.content
+
+    def get_payload(self, object_name: str) -> dict:
+        return {"content": self.content}
+
+
+def _use_fake_minio():
+    """Replace MinIO before the server modules create their global operators"""
+    import src.utils
+    src.utils.get_minio_operator = FakeMinioOperator
+
+
+def _retrieved_documents(count: int):
+    from langchain_core.documents import Document
+    rng = random.Random(0)
+    documents = []
+    for i in range(count):
+        chunk_type = "text" if i % 3 else "image"
+        documents.append(Document(
+            page_content=" ".join(f"word{rng.randint(0, 5000)}" for _ in range(200)),
+            metadata={
+                "source": {"source_id": f"/tmp-data/uploaded_files/document_{i % 4}.pdf", "source_name": f"document_{i % 4}.pdf"},
+                "content_metadata": {"type": chunk_type, "page_number": i, "location": [0.0, 0.0, 100.0, 100.0]},
+                "relevance_score": rng.uniform(-10, 10),
+            }
+        ))
+    return documents
+
+
+@benchmark("streaming_filter_think")
+def bench_streaming_filter_think():
+    from src.utils import streaming_filter_think
+    tokens = ["<think>"] + [f" reasoning{i}" for i in range(200)] + ["</think>"] + [f" answer{i}" for i in range(300)]
+    chunks = [SimpleNamespace(content=token) for token in tokens]
+    return lambda: list(streaming_filter_think(chunks))
+
+
+@benchmark("format_document_with_source")
+def bench_format_document_with_source():
+    from src.utils import format_document_with_source
+    documents = _retrieved_documents(10)
+    return lambda: [format_document_with_source(document) for document in documents]
+
+
+@benchmark("normalize_relevance_scores")
+def bench_normalize_relevance_scores():
+    from src.utils import normalize_relevance_scores
+    documents = _retrieved_documents(100)
+    scores = [document.metadata["relevance_score"] for document in documents]
+
+    def _run():
+        for document, score in zip(documents, scores):
+            document.metadata["relevance_score"] = score
+        return normalize_relevance_scores(documents)
+    return _run
+
+
+@benchmark("prepare_citations")
+def bench_prepare_citations():
+    _use_fake_minio()
+    from src.server import prepare_citations
+    documents = _retrieved_documents(10)
+    return lambda: prepare_citations(collection_name="benchmark", retrieved_documents=documents, enable_citations=True)
+
+
+@benchmark("message_validation")
+def bench_message_validation():
+    _use_fake_minio()
+    from src.server import Message
+    content = "<p>What does the <b>quarterly report</b> say about revenue?</p> " * 50
+    return lambda: Message(role="user", content=content)
+
+
+@benchmark("chain_response_sse_chunk")
+def bench_chain_response_sse_chunk():
+    """Per token ChainResponse construction and serialization as done in generate_answer"""
+    _use_fake_minio()
+    import time
+    from src.server import ChainResponse, ChainResponseChoices, Message
+    tokens = [f" token{i}" for i in range(256)]
+
+    def _run():
+        chunks = []
+        for token in tokens:
+            chain_response = ChainResponse()
+            response_choice = ChainResponseChoices(
+                index=0,
+                message=Message(role="assistant", content=token),
+                delta=Message(role=None, content=token),
+                finish_reason=None
+            )
+            chain_response.id = "benchmark"
+            chain_response.choices.append(response_choice)
+            chain_response.model = "benchmark"
+            chain_response.object = "chat.completion.chunk"
+            chain_response.created = int(time.time())
+            chunks.append("data: " + str(chain_response.json()) + "\n\n")
+        return chunks
+    return _run
+
+
+@benchmark("prepare_langchain_documents")
+def bench_prepare_langchain_documents():
+    _use_fake_minio()
+    from src.ingestor_server.main import NVIngestIngestor
+    rng = random.Random(0)
+    image = base64.b64encode(rng.randbytes(32 * 1024)).decode("ascii")
+
+    def _element(i: int) -> dict:
+        metadata = {
+            "source_metadata": {"source_id": f"/tmp-data/uploaded_files/document_{i % 10}.pdf"},
+            "content_metadata": {"page_number": i, "location": [0.0, 0.0, 100.0, 100.0], "subtype": "table"},
+        }
+        if i % 5 == 0:
+            metadata.update(content=image, image_metadata={"caption": "A chart of quarterly revenue"})
+            return {"document_type": "image", "metadata": metadata}
+        if i % 7 == 0:
+            metadata.update(content=image, table_metadata={"table_content": "| quarter | revenue |\n| Q1 | 100 |"})
+            return {"document_type": "structured", "metadata": metadata}
+        metadata.update(content=" ".join(f"word{rng.randint(0, 5000)}" for _ in range(300)))
+        return {"document_type": "text", "metadata": metadata}
+
+    results = [[_element(i) for i in range(document * 100, document * 100 + 100)] for document in range(10)]
+    ingestor = NVIngestIngestor()
+    return lambda: ingestor._prepare_langchain_documents(results)
+
+
+def run_benchmark(function: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Time a callable and return per call statistics in microseconds"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    per_call = [total / number * 1e6 for total in timer.repeat(repeat=repeat, number=number)]
+    return {"min_us": min(per_call), "median_us": statistics.median(per_call), "calls_per_repeat": number}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="Only run benchmarks containing this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--save-baseline", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Compare results with this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOGLEVEL", "WARNING")
+    baseline = json.loads(Path(args.compare).read_text())["results"] if args.compare else {}
+
+    results, regressions = {}, []
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = run_benchmark(setup(), args.repeat, args.min_time)
+        line = f"{name:32s} {results[name]['min_us']:12.1f} us/call"
+        if name in baseline:
+            change = results[name]["min_us"] / baseline[name]["min_us"] - 1
+            line += f"  ({change:+.1%} vs baseline)"
+            if change > args.threshold:
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "results": results,
+        }, indent=2))
+        print(f"[+] Baseline written to {args.save_baseline}")
+
+    if regressions:
+        print(f"[!] Slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+# The proxy is a single module deployed on its own, not part of the src package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "nim_proxy"))
+
+import nim_proxy  # noqa: E402
+
+
+@pytest.fixture
+def make_pool():
+    """Create an UpstreamPool whose replicas are answered by the handler of an httpx.MockTransport."""
+    def make(handler, urls="http://replica-a/v1/embeddings"):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return nim_proxy.UpstreamPool("test", urls, client)
+    return make
+
+
+@pytest.fixture
+def scheduler():
+    return nim_proxy.LaneScheduler(
+        max_inflight=4,
+        lanes={nim_proxy.INTERACTIVE_LANE: (4, 4), nim_proxy.BULK_LANE: (1, 2)},
+    )
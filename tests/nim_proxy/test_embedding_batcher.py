@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+import httpx
+
+import nim_proxy
+
+
+def embedding_handler(calls):
+    """Fake embedding NIM returning the length of each input as its embedding, in reverse index order.
+    Inputs containing "bad" are rejected with a 400 like the NIM does for invalid input."""
+    def handler(request):
+        payload = json.loads(request.content)
+        calls.append(payload)
+        if any("bad" in text for text in payload["input"]):
+            return httpx.Response(400, json={"detail": "invalid input"})
+        data = [{"index": index, "embedding": [float(len(text))]} for index, text in enumerate(payload["input"])]
+        return httpx.Response(200, json={"object": "list", "data": data[::-1], "usage": {"total_tokens": 1}})
+    return handler
+
+
+def embedding_values(response):
+    return [item["embedding"][0] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+
+def test_embeddings_are_scattered_back_to_their_requests(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=32, max_wait_ms=5)
+        return await asyncio.gather(
+            batcher.embed({"model": "m", "input": ["a", "bb"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": "ccc"}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": ["dddd", "eeeee", "ffffff"]}, nim_proxy.INTERACTIVE_LANE),
+        )
+
+    first, second, third = asyncio.run(run())
+    assert len(calls) == 1
+    assert calls[0]["input"] == ["a", "bb", "ccc", "dddd", "eeeee", "ffffff"]
+    assert embedding_values(first) == [1, 2]
+    assert embedding_values(second) == [3]
+    assert embedding_values(third) == [4, 5, 6]
+    assert [item["index"] for item in third["data"]] == [0, 1, 2]
+    assert "usage" not in first and first["object"] == "list"
+
+
+def test_requests_are_batched_by_model_and_input_type(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=32, max_wait_ms=5)
+        return await asyncio.gather(
+            batcher.embed({"model": "m", "input_type": "query", "input": ["a"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input_type": "passage", "input": ["bb"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "other", "input_type": "query", "input": ["ccc"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input_type": "query", "input": ["dddd"]}, nim_proxy.INTERACTIVE_LANE),
+        )
+
+    responses = asyncio.run(run())
+    assert [embedding_values(response) for response in responses] == [[1], [2], [3], [4]]
+    batches = sorted((call["model"], call["input_type"], call["input"]) for call in calls)
+    assert batches == [("m", "passage", ["bb"]), ("m", "query", ["a", "dddd"]), ("other", "query", ["ccc"])]
+
+
+def test_full_batch_is_sent_without_waiting(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        # The wait is far longer than the test, only a flush on size can answer the requests in time
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=4, max_wait_ms=60000)
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.embed({"model": "m", "input": ["a", "bb"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": ["ccc", "dddd"]}, nim_proxy.INTERACTIVE_LANE),
+        ), timeout=5)
+
+    first, second = asyncio.run(run())
+    assert [call["input"] for call in calls] == [["a", "bb", "ccc", "dddd"]]
+    assert embedding_values(first) == [1, 2]
+    assert embedding_values(second) == [3, 4]
+
+
+def test_request_overflowing_the_batch_starts_a_new_one(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=4, max_wait_ms=5)
+        return await asyncio.gather(
+            batcher.embed({"model": "m", "input": ["a", "bb", "ccc"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": ["dddd", "eeeee"]}, nim_proxy.INTERACTIVE_LANE),
+        )
+
+    first, second = asyncio.run(run())
+    assert [call["input"] for call in calls] == [["a", "bb", "ccc"], ["dddd", "eeeee"]]
+    assert embedding_values(first) == [1, 2, 3]
+    assert embedding_values(second) == [4, 5]
+
+
+def test_partial_batch_is_sent_after_the_wait(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=32, max_wait_ms=50)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        request = asyncio.create_task(batcher.embed({"model": "m", "input": ["a"]}, nim_proxy.INTERACTIVE_LANE))
+        await asyncio.sleep(0.01)
+        # Still waiting for other requests to join the batch
+        assert calls == [] and not request.done()
+        response = await request
+        return response, loop.time() - start
+
+    response, elapsed = asyncio.run(run())
+    assert len(calls) == 1
+    assert elapsed >= 0.05
+    assert embedding_values(response) == [1]
+
+
+def test_rejected_input_only_fails_its_own_request(make_pool, scheduler):
+    calls = []
+
+    async def run():
+        batcher = nim_proxy.EmbeddingBatcher(make_pool(embedding_handler(calls)), scheduler, max_size=32, max_wait_ms=5)
+        return await asyncio.gather(
+            batcher.embed({"model": "m", "input": ["a"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": ["bad", "bb"]}, nim_proxy.INTERACTIVE_LANE),
+            batcher.embed({"model": "m", "input": ["ccc"]}, nim_proxy.INTERACTIVE_LANE),
+            return_exceptions=True,
+        )
+
+    first, second, third = asyncio.run(run())
+    assert embedding_values(first) == [1]
+    assert isinstance(second, httpx.HTTPStatusError) and second.response.status_code == 400
+    assert embedding_values(third) == [3]
+    # The rejected batch, then each of its requests on its own
+    assert [call["input"] for call in calls] == [["a", "bad", "bb", "ccc"], ["a"], ["bad", "bb"], ["ccc"]]
+    assert scheduler.inflight == {nim_proxy.INTERACTIVE_LANE: 0, nim_proxy.BULK_LANE: 0}
@@ -0,0 +1,131 @@
+import asyncio
+from collections import Counter
+
+import nim_proxy
+
+INTERACTIVE = nim_proxy.INTERACTIVE_LANE
+BULK = nim_proxy.BULK_LANE
+
+
+async def settle():
+    """Let the tasks woken by the scheduler run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_freed_slots_follow_the_lane_weights():
+    scheduler = nim_proxy.LaneScheduler(max_inflight=1, lanes={INTERACTIVE: (3, 1), BULK: (1, 1)})
+    granted = []
+
+    async def call(lane):
+        await scheduler.acquire(lane)
+        granted.append(lane)
+
+    async def run():
+        await scheduler.acquire(INTERACTIVE)
+        holder = INTERACTIVE
+        waiters = [asyncio.create_task(call(lane)) for lane in [INTERACTIVE] * 12 + [BULK] * 12]
+        await settle()
+        assert scheduler.queue_depth(INTERACTIVE) == 12 and scheduler.queue_depth(BULK) == 12
+        for _ in range(16):
+            scheduler.release(holder)
+            await settle()
+            holder = granted[-1]
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(run())
+    assert Counter(granted) == {INTERACTIVE: 12, BULK: 4}
+    # Smooth round robin interleaves the lanes instead of serving them in runs
+    assert granted[:4] == [INTERACTIVE, INTERACTIVE, BULK, INTERACTIVE]
+
+
+def test_bulk_lane_is_capped_without_blocking_interactive_calls(scheduler):
+    async def run():
+        await scheduler.acquire(BULK)
+        await scheduler.acquire(BULK)
+        third_bulk = asyncio.create_task(scheduler.acquire(BULK))
+        await settle()
+        # The bulk lane is at its cap of 2, interactive calls still get the free slots
+        assert not third_bulk.done() and scheduler.queue_depth(BULK) == 1
+        await asyncio.wait_for(scheduler.acquire(INTERACTIVE), timeout=1)
+        assert scheduler.inflight == {INTERACTIVE: 1, BULK: 2}
+
+        scheduler.release(BULK)
+        await settle()
+        assert third_bulk.done()
+        assert scheduler.inflight == {INTERACTIVE: 1, BULK: 2}
+
+    asyncio.run(run())
+
+
+def test_new_call_waits_behind_its_queued_lane(scheduler):
+    async def run():
+        for _ in range(4):
+            await scheduler.acquire(INTERACTIVE)
+        queued = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await settle()
+        scheduler.release(INTERACTIVE)
+        later = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await settle()
+        # The freed slot went to the call that was already waiting
+        assert queued.done() and not later.done()
+        later.cancel()
+        await asyncio.gather(later, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_cancelled_queued_call_does_not_leak_a_slot():
+    scheduler = nim_proxy.LaneScheduler(max_inflight=1, lanes={INTERACTIVE: (4, 1), BULK: (1, 1)})
+
+    async def run():
+        await scheduler.acquire(INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(BULK))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.queue_depth(BULK) == 0
+
+        scheduler.release(INTERACTIVE)
+        assert scheduler.inflight == {INTERACTIVE: 0, BULK: 0}
+        await asyncio.wait_for(scheduler.acquire(BULK), timeout=1)
+        scheduler.release(BULK)
+
+    asyncio.run(run())
+    assert scheduler.inflight == {INTERACTIVE: 0, BULK: 0}
+
+
+def test_call_cancelled_after_being_granted_passes_its_slot_on():
+    scheduler = nim_proxy.LaneScheduler(max_inflight=1, lanes={INTERACTIVE: (4, 1), BULK: (1, 1)})
+
+    async def run():
+        await scheduler.acquire(INTERACTIVE)
+        cancelled = asyncio.create_task(scheduler.acquire(BULK))
+        await settle()
+        # Grant the slot to the bulk call, and cancel it before it resumes
+        scheduler.release(INTERACTIVE)
+        assert scheduler.inflight == {INTERACTIVE: 0, BULK: 1}
+        next_call = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await settle()
+        assert next_call.done()
+        scheduler.release(INTERACTIVE)
+
+    asyncio.run(run())
+    assert scheduler.inflight == {INTERACTIVE: 0, BULK: 0}
+
+
+def test_slot_is_released_when_the_call_fails(scheduler):
+    async def run():
+        try:
+            async with scheduler.slot(INTERACTIVE):
+                raise RuntimeError("upstream failed")
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    assert scheduler.inflight == {INTERACTIVE: 0, BULK: 0}
+    assert scheduler.requests[INTERACTIVE] == 1
@@ -0,0 +1,194 @@
+import asyncio
+
+import httpx
+import pytest
+
+import nim_proxy
+
+URLS = "http://replica-a/v1/embeddings,http://replica-b/v1/embeddings,http://replica-c/v1/embeddings"
+
+
+def ok(request):
+    return httpx.Response(200, json={"replica": request.url.host})
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(nim_proxy, "NIM_PROXY_HEDGING", True)
+
+    def with_p95(pool, latency):
+        pool._latencies.extend([latency] * nim_proxy.NIM_PROXY_HEDGING_MIN_SAMPLES)
+    return with_p95
+
+
+def test_call_goes_to_the_replica_with_fewest_outstanding_calls(make_pool):
+    pool = make_pool(ok, URLS)
+    first, second, third = pool.replicas
+    first.outstanding, second.outstanding, third.outstanding = 2, 0, 1
+    assert pool.acquire() is second
+    # second and third now tie with one outstanding call each
+    assert pool.acquire() in (second, third)
+
+
+def test_ties_are_spread_over_the_replicas(make_pool):
+    pool = make_pool(ok, URLS)
+    picked = set()
+    for _ in range(len(pool.replicas)):
+        replica = pool.acquire()
+        picked.add(replica.url)
+        pool.release(replica, 0.01, succeeded=True)
+    assert len(picked) == len(pool.replicas)
+
+
+def test_failing_replica_is_ejected(make_pool):
+    def handler(request):
+        return httpx.Response(503 if request.url.host == "replica-a" else 200)
+
+    pool = make_pool(handler, URLS)
+    first = pool.replicas[0]
+
+    async def run():
+        # Every replica is called until replica-a has failed enough calls in a row
+        while first.consecutive_failures < nim_proxy.NIM_PROXY_EJECTION_FAILURES:
+            await pool.post({"input": ["a"]})
+        return [(await pool.post({"input": ["a"]})).status_code for _ in range(10)]
+
+    assert asyncio.run(run()) == [200] * 10
+    assert first.is_ejected(nim_proxy.time.monotonic())
+    assert all(replica.outstanding == 0 for replica in pool.replicas)
+
+
+def test_success_resets_the_failure_count(make_pool):
+    pool = make_pool(ok)
+    replica = pool.replicas[0]
+    for _ in range(nim_proxy.NIM_PROXY_EJECTION_FAILURES - 1):
+        pool.release(pool.acquire(), 0.01, succeeded=False)
+    pool.release(pool.acquire(), 0.01, succeeded=True)
+    pool.release(pool.acquire(), 0.01, succeeded=False)
+    assert replica.consecutive_failures == 1
+    assert not replica.is_ejected(nim_proxy.time.monotonic())
+
+
+def test_replica_ejected_first_is_used_when_all_are_ejected(make_pool):
+    pool = make_pool(ok, URLS)
+    now = nim_proxy.time.monotonic()
+    first, second, third = pool.replicas
+    first.ejected_until, second.ejected_until, third.ejected_until = now + 30, now + 10, now + 20
+    assert pool.acquire() is second
+    # Even when it is busier than the others
+    assert pool.acquire() is second
+
+
+def test_cancelled_call_is_not_a_failure(make_pool):
+    async def handler(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    pool = make_pool(handler)
+
+    async def run():
+        call = asyncio.create_task(pool.post({"input": ["a"]}))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+
+    asyncio.run(run())
+    replica = pool.replicas[0]
+    assert replica.outstanding == 0 and replica.consecutive_failures == 0
+    assert len(pool._latencies) == 0
+
+
+def test_slow_call_is_hedged_after_the_p95_latency(make_pool, hedging):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.host)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return httpx.Response(200, json={"replica": request.url.host})
+
+    pool = make_pool(handler, URLS)
+    hedging(pool, 0.02)
+
+    async def run():
+        resp = await asyncio.wait_for(pool.post({"input": ["a"]}, hedge=True), timeout=5)
+        # Let the cancelled primary call end
+        await asyncio.sleep(0.01)
+        return resp
+
+    resp = asyncio.run(run())
+    assert len(calls) == 2 and calls[0] != calls[1]
+    assert resp.json()["replica"] == calls[1]
+    assert pool.hedged_requests == 1
+    assert all(replica.outstanding == 0 for replica in pool.replicas)
+    assert all(replica.consecutive_failures == 0 for replica in pool.replicas)
+
+
+def test_fast_call_is_not_hedged(make_pool, hedging):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.host)
+        return httpx.Response(200)
+
+    pool = make_pool(handler, URLS)
+    hedging(pool, 1)
+    assert asyncio.run(pool.post({"input": ["a"]}, hedge=True)).status_code == 200
+    assert len(calls) == 1 and pool.hedged_requests == 0
+
+
+def test_call_is_not_hedged_without_enough_samples(make_pool, hedging):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.host)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    pool = make_pool(handler, URLS)
+    pool._latencies.extend([0.001] * (nim_proxy.NIM_PROXY_HEDGING_MIN_SAMPLES - 1))
+    assert pool.p95_latency() is None
+    assert asyncio.run(pool.post({"input": ["a"]}, hedge=True)).status_code == 200
+    assert len(calls) == 1 and pool.hedged_requests == 0
+
+
+def test_success_is_preferred_when_hedged_calls_finish_together(make_pool, hedging):
+    calls = []
+    both_started = None
+
+    async def handler(request):
+        calls.append(request.url.host)
+        if len(calls) == 2:
+            both_started.set()
+        await both_started.wait()
+        # The primary call fails, the hedge succeeds, and both are done by the time the pool checks them
+        return httpx.Response(503 if request.url.host == calls[0] else 200)
+
+    async def run(pool):
+        nonlocal both_started
+        both_started = asyncio.Event()
+        return await pool.post({"input": ["a"]}, hedge=True)
+
+    # The order of the finished calls is arbitrary, repeat so a failure returned first would show
+    for _ in range(20):
+        calls.clear()
+        pool = make_pool(handler, URLS)
+        hedging(pool, 0.001)
+        assert asyncio.run(run(pool)).status_code == 200
+        assert pool.hedged_requests == 1
+
+
+def test_failed_hedged_calls_return_the_response(make_pool, hedging):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.host)
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            return httpx.Response(503)
+        raise httpx.ConnectError("connection refused")
+
+    pool = make_pool(handler, URLS)
+    hedging(pool, 0.001)
+    assert asyncio.run(pool.post({"input": ["a"]}, hedge=True)).status_code == 503
+    assert pool.hedged_requests == 1
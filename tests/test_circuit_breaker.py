@@ -0,0 +1,125 @@
+import pytest
+
+from src import circuit_breaker
+from src.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        "test", latency_threshold=1.0, window_size=10, min_calls=4, failure_rate_threshold=0.5, cooldown=30, clock=clock
+    )
+
+
+@pytest.fixture(autouse=True)
+def breakers_enabled(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "ENABLE_CIRCUIT_BREAKERS", True)
+
+
+def test_breaker_opens_then_half_opens_after_the_cooldown(breaker, clock):
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only a single trial call is let through
+    assert not breaker.allow()
+
+
+def test_successful_trial_call_closes_the_breaker(breaker, clock):
+    for _ in range(4):
+        breaker.record(0.1, succeeded=False)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(0.1, succeeded=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    # The failures before opening are forgotten
+    for _ in range(3):
+        breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_call_reopens_for_a_new_cooldown(breaker, clock):
+    for _ in range(4):
+        breaker.record(0.1, succeeded=False)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_breaker_stays_closed_below_the_minimum_calls(breaker):
+    for _ in range(3):
+        breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failure_rate_is_computed_over_the_rolling_window(breaker):
+    for _ in range(6):
+        breaker.record(0.1, succeeded=True)
+    # 4 failures in 10 calls stay below the 50% threshold
+    for _ in range(4):
+        breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+    # 5 failures in 11 calls, but the oldest success left the window of 10 calls
+    breaker.record(0.1, succeeded=False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_slow_successful_calls_count_as_failures(breaker):
+    for _ in range(2):
+        breaker.record(0.5, succeeded=True)
+    breaker.record(1.5, succeeded=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(1.01, succeeded=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_slow_trial_call_reopens_the_breaker(breaker, clock):
+    for _ in range(4):
+        breaker.record(2.0, succeeded=True)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(2.0, succeeded=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_expected_latency_only_follows_successful_calls(breaker):
+    breaker.record(1.0, succeeded=True)
+    assert breaker.expected_latency == 1.0
+    breaker.record(5.0, succeeded=False)
+    assert breaker.expected_latency == 1.0
+    breaker.record(2.0, succeeded=True)
+    assert breaker.expected_latency == pytest.approx(1.2)
+
+
+def test_disabled_breaker_allows_every_call(breaker, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "ENABLE_CIRCUIT_BREAKERS", False)
+    for _ in range(4):
+        breaker.record(0.1, succeeded=False)
+    assert breaker.allow()